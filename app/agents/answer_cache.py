@@ -0,0 +1,72 @@
+# app/agents/answer_cache.py
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", 0.95))
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", 4096))
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype="float32").reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticAnswerCache:
+    """
+    Answers keyed by (paper, question embedding).
+
+    A lookup returns the stored answer of the most similar earlier question on the
+    same paper if its cosine similarity is at least `threshold`, so rephrasings of
+    popular questions skip retrieval and generation. `paper_key` should change
+    whenever the paper content or retrieval settings do. The cache holds at most
+    `max_entries` answers across all papers and evicts the least recently used.
+    """
+
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, max_entries=ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # (paper_key, question) -> answer, in LRU order
+        self._answers = OrderedDict()
+        # paper_key -> {question: unit question embedding}
+        self._questions = {}
+        self._lock = threading.Lock()
+
+    def get(self, paper_key, question_embedding):
+        query = _unit(question_embedding)
+        with self._lock:
+            questions = self._questions.get(paper_key)
+            if questions:
+                texts = list(questions)
+                scores = np.stack([questions[text] for text in texts]) @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    key = (paper_key, texts[best])
+                    self._answers.move_to_end(key)
+                    self.hits += 1
+                    return dict(self._answers[key])
+            self.misses += 1
+            return None
+
+    def put(self, paper_key, question, question_embedding, answer):
+        key = (paper_key, question)
+        with self._lock:
+            self._answers[key] = dict(answer)
+            self._answers.move_to_end(key)
+            self._questions.setdefault(paper_key, {})[question] = _unit(question_embedding)
+            while len(self._answers) > self.max_entries:
+                (old_paper, old_question), _ = self._answers.popitem(last=False)
+                questions = self._questions[old_paper]
+                del questions[old_question]
+                if not questions:
+                    del self._questions[old_paper]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._answers), "threshold": self.threshold}
@@ -0,0 +1,192 @@
+# app/agents/arxiv_harvester.py
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from db.db_init import parse_year
+
+ARXIV_API_URL = os.environ.get("ARXIV_API_URL", "https://export.arxiv.org/api/query")
+ARXIV_PAGE_SIZE = int(os.environ.get("ARXIV_PAGE_SIZE", 100))
+# arXiv asks clients to leave three seconds between API calls
+ARXIV_REQUEST_INTERVAL = float(os.environ.get("ARXIV_REQUEST_INTERVAL", 3.0))
+ARXIV_MAX_RETRIES = int(os.environ.get("ARXIV_MAX_RETRIES", 3))
+ARXIV_TIMEOUT = float(os.environ.get("ARXIV_TIMEOUT", 30))
+# Results fetched by /get_papers/ when a topic is not in the database yet
+ARXIV_FETCH_LIMIT = int(os.environ.get("ARXIV_FETCH_LIMIT", 100))
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+OPENSEARCH = "{http://a9.com/-/spec/opensearch/1.1/}"
+
+
+def parse_feed(stream, topic, on_total=None):
+    """
+    Yield paper dicts from an arXiv Atom feed as each <entry> is parsed, clearing
+    parsed elements so memory stays flat. `on_total(n)` receives the feed's
+    opensearch:totalResults, which arXiv sends before the entries.
+    """
+    for _, element in ET.iterparse(stream, events=("end",)):
+        if element.tag == OPENSEARCH + "totalResults" and on_total is not None:
+            on_total(int(element.text or 0))
+        elif element.tag == ATOM + "entry":
+            url = (element.findtext(ATOM + "id") or "").strip()
+            title = " ".join((element.findtext(ATOM + "title") or "").split())
+            year = parse_year(element.findtext(ATOM + "published"))
+            element.clear()
+            # Query errors come back as a single entry whose id points at the error docs
+            if url and title and "/api/errors" not in url:
+                yield {"title": title, "year": year, "topic": topic, "url": url}
+
+
+class RateLimiter:
+    """
+    Spaces calls at least `interval` seconds apart across all threads sharing it.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._next_call = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            delay = self._next_call - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_call = time.monotonic() + self.interval
+
+
+# One limiter per process: the arXiv limit applies to the client, not to each harvester
+arxiv_rate_limiter = RateLimiter(ARXIV_REQUEST_INTERVAL)
+
+
+class _Job:
+    def __init__(self, thread, stop_event):
+        self.thread = thread
+        self.stop_event = stop_event
+
+
+class ArxivHarvester:
+    """
+    Pages through arXiv API results for a topic and stores them as they arrive.
+
+    Each page of `page_size` results is requested with start/max_results, parsed
+    incrementally from the response stream and written with one `db.create_papers`
+    call, so large topics never sit in memory. Requests go through a shared rate
+    limiter and are retried on 429/5xx. Whole topics can be harvested on a background
+    thread whose progress is stored in Neo4j, so an interrupted harvest resumes where
+    it stopped.
+    """
+
+    def __init__(self, db, api_url=ARXIV_API_URL, page_size=ARXIV_PAGE_SIZE, max_retries=ARXIV_MAX_RETRIES,
+                 timeout=ARXIV_TIMEOUT, rate_limiter=None):
+        self.db = db
+        self.api_url = api_url
+        self.page_size = page_size
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter if rate_limiter is not None else arxiv_rate_limiter
+
+        retry = Retry(total=max_retries, backoff_factor=1.0, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=("GET",), respect_retry_after_header=True)
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(max_retries=retry))
+        self.session.mount("https://", HTTPAdapter(max_retries=retry))
+
+        self._jobs = {}
+        self._jobs_lock = threading.Lock()
+
+    def iter_batches(self, topic, start=0, max_results=None, sort_by="relevance", sort_order="descending"):
+        """
+        Yield (next_start, papers, total_results) for each page of results, beginning
+        at offset `start` and stopping after `max_results` papers or at the end.
+        """
+        fetched = 0
+        while max_results is None or fetched < max_results:
+            size = self.page_size if max_results is None else min(self.page_size, max_results - fetched)
+            self.rate_limiter.wait()
+            params = {"search_query": topic, "start": start, "max_results": size,
+                      "sortBy": sort_by, "sortOrder": sort_order}
+            totals = []
+            with self.session.get(self.api_url, params=params, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                papers = list(parse_feed(response.raw, topic, totals.append))
+            if not papers:
+                return
+            # arXiv sometimes returns short pages; continue from what was actually received
+            start += len(papers)
+            fetched += len(papers)
+            total = totals[0] if totals else None
+            yield start, papers, total
+            if total is not None and start >= total:
+                return
+
+    def harvest(self, topic, start=0, max_results=None, sort_by="relevance", sort_order="descending",
+                on_batch=None, stop_event=None):
+        """
+        Store every page of results for `topic` as soon as it is parsed. Calls
+        `on_batch(next_start, total_results)` after each page is written and stops
+        early once `stop_event` is set. Returns the number of new papers.
+        """
+        created = 0
+        for next_start, papers, total in self.iter_batches(topic, start, max_results, sort_by, sort_order):
+            created += self.db.create_papers(papers)
+            if on_batch is not None:
+                on_batch(next_start, total)
+            if stop_event is not None and stop_event.is_set():
+                break
+        return created
+
+    def start_background(self, topic, max_results=None, restart=False):
+        """
+        Harvest all of `topic` (or its first `max_results` papers) on a background
+        thread, resuming from the offset stored by an earlier run unless `restart`.
+        Returns the harvest status.
+        """
+        with self._jobs_lock:
+            job = self._jobs.get(topic)
+            if job is not None and job.thread.is_alive():
+                return self.status(topic)
+            state = {} if restart else (self.db.get_harvest_state(topic) or {})
+            if state.get("status") == "done" and state.get("max_results") == max_results:
+                return self.status(topic)
+
+            start = state.get("next_start", 0)
+            self.db.save_harvest_state(topic, status="running", next_start=start, max_results=max_results, error=None)
+            stop_event = threading.Event()
+            thread = threading.Thread(target=self._run, args=(topic, start, max_results, stop_event),
+                                      name=f"arxiv-harvest-{topic}", daemon=True)
+            self._jobs[topic] = _Job(thread, stop_event)
+            thread.start()
+        return self.status(topic)
+
+    def _run(self, topic, start, max_results, stop_event):
+        def checkpoint(next_start, total):
+            self.db.save_harvest_state(topic, next_start=next_start, total_results=total)
+
+        try:
+            remaining = None if max_results is None else max(max_results - start, 0)
+            # Oldest first, so papers published during the harvest only append to the
+            # result list and stored offsets stay valid when resuming
+            self.harvest(topic, start, remaining, sort_by="submittedDate", sort_order="ascending",
+                         on_batch=checkpoint, stop_event=stop_event)
+            self.db.save_harvest_state(topic, status="stopped" if stop_event.is_set() else "done")
+        except Exception as exc:
+            self.db.save_harvest_state(topic, status="failed", error=str(exc))
+
+    def stop(self, topic):
+        with self._jobs_lock:
+            job = self._jobs.get(topic)
+            if job is not None:
+                job.stop_event.set()
+        return self.status(topic)
+
+    def status(self, topic):
+        state = dict(self.db.get_harvest_state(topic) or {"topic": topic, "status": "not_started"})
+        job = self._jobs.get(topic)
+        state["active"] = job is not None and job.thread.is_alive()
+        return state
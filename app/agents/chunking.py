@@ -0,0 +1,97 @@
+# app/agents/chunking.py
+import os
+import re
+
+from app.agents.document import Chunk
+
+# 0 derives the chunk size from the embedding and generation models' context windows
+CHUNK_MAX_TOKENS = int(os.environ.get("CHUNK_MAX_TOKENS", 0))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", 32))
+# Pages are tokenized in batches of this many as they stream out of the extractor
+CHUNK_PAGE_BATCH = int(os.environ.get("CHUNK_PAGE_BATCH", 8))
+# Chunks that share one answer prompt, and prompt tokens kept free for the question
+ANSWER_CONTEXT_CHUNKS = int(os.environ.get("ANSWER_CONTEXT_CHUNKS", 2))
+ANSWER_PROMPT_RESERVE = int(os.environ.get("ANSWER_PROMPT_RESERVE", 64))
+
+# Tokenizers without a real limit report a huge placeholder model_max_length
+_UNBOUNDED = 100_000
+
+
+def chunk_token_budget(embedding_model, generator_tokenizer=None, context_chunks=ANSWER_CONTEXT_CHUNKS,
+                       prompt_reserve=ANSWER_PROMPT_RESERVE):
+    """
+    Largest chunk, in embedding tokens, that the embedding model encodes without
+    truncation and of which `context_chunks` still fit in one answer prompt.
+    """
+    limit = getattr(embedding_model, "max_seq_length", None)
+    if not limit:
+        limit = getattr(getattr(embedding_model, "tokenizer", None), "model_max_length", 512)
+    budget = min(limit, _UNBOUNDED) - 2  # [CLS] and [SEP]
+    generator_limit = getattr(generator_tokenizer, "model_max_length", None)
+    if generator_limit and generator_limit < _UNBOUNDED:
+        budget = min(budget, (generator_limit - prompt_reserve) // context_chunks)
+    return max(budget, 16)
+
+
+class TokenChunker:
+    """
+    Splits page text into windows of at most `max_tokens` tokens of `tokenizer`, with
+    `overlap` tokens shared between consecutive windows of a page.
+
+    Pages are encoded in batches with a fast tokenizer's offset mapping, so chunk
+    text is sliced from the original page text and no decode round trip is needed.
+    Tokenizers without offsets (and `tokenizer=None`) fall back to whitespace words.
+    Each chunk is tagged with the section heading in effect where it starts
+    (headings carry over page breaks), or the first heading inside it if no section
+    has started yet.
+    """
+
+    def __init__(self, tokenizer, max_tokens, overlap=CHUNK_OVERLAP_TOKENS, page_batch=CHUNK_PAGE_BATCH):
+        if not 0 <= overlap < max_tokens:
+            raise ValueError(f"Chunk overlap must be in [0, {max_tokens}), got {overlap}")
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+        self.page_batch = page_batch
+
+    def _offsets(self, texts):
+        if getattr(self.tokenizer, "is_fast", False):
+            encoded = self.tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True,
+                                     return_attention_mask=False, truncation=False, verbose=False)
+            return encoded["offset_mapping"]
+        return [[match.span() for match in re.finditer(r"\S+", text)] for text in texts]
+
+    def _windows(self, offsets):
+        step = self.max_tokens - self.overlap
+        for start in range(0, len(offsets), step):
+            yield offsets[start:start + self.max_tokens]
+            if start + self.max_tokens >= len(offsets):
+                break
+
+    def iter_chunks(self, pages):
+        heading = None
+        batch = []
+        for page in pages:
+            batch.append(page)
+            if len(batch) >= self.page_batch:
+                heading = yield from self._chunk_batch(batch, heading)
+                batch = []
+        if batch:
+            yield from self._chunk_batch(batch, heading)
+
+    def _chunk_batch(self, pages, heading):
+        texts = [page[1] for page in pages]
+        for page, text, offsets in zip(pages, texts, self._offsets(texts)):
+            headings = page[2] if len(page) > 2 else ()
+            for window in self._windows(offsets):
+                start, end = window[0][0], window[-1][1]
+                chunk_heading = heading
+                for offset, title in headings:
+                    if offset <= start:
+                        chunk_heading = title
+                    elif chunk_heading is None and offset < end:
+                        chunk_heading = title
+                yield Chunk(page[0], " ".join(text[start:end].split()), chunk_heading)
+            if headings:
+                heading = headings[-1][1]
+        return heading
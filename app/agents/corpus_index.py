@@ -0,0 +1,118 @@
+# app/agents/corpus_index.py
+import math
+import os
+
+import faiss
+import numpy as np
+
+RETRIEVAL_INDEX_TYPE = os.environ.get("RETRIEVAL_INDEX_TYPE", "auto")
+# With "auto", collections up to this many chunks use exact search
+RETRIEVAL_FLAT_LIMIT = int(os.environ.get("RETRIEVAL_FLAT_LIMIT", 4096))
+RETRIEVAL_NPROBE = int(os.environ.get("RETRIEVAL_NPROBE", 8))
+RETRIEVAL_HNSW_M = int(os.environ.get("RETRIEVAL_HNSW_M", 32))
+RETRIEVAL_EF_SEARCH = int(os.environ.get("RETRIEVAL_EF_SEARCH", 64))
+
+INDEX_TYPES = ("auto", "flat", "ivf", "hnsw")
+
+
+class CorpusIndex:
+    """
+    A single FAISS index over the chunks of several Documents.
+
+    Chunks of each paper occupy a contiguous id range, so retrieval can run globally
+    or be restricted to one paper with an IDSelectorRange instead of keeping one
+    index per paper. `index_type` picks exact search ("flat"), an inverted file
+    ("ivf") or an HNSW graph ("hnsw"); "auto" switches from flat to HNSW once the
+    collection grows past RETRIEVAL_FLAT_LIMIT chunks.
+    """
+
+    def __init__(self, documents, index_type=RETRIEVAL_INDEX_TYPE, nprobe=RETRIEVAL_NPROBE,
+                 hnsw_m=RETRIEVAL_HNSW_M, ef_search=RETRIEVAL_EF_SEARCH):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+        documents = list(documents)
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.hnsw_m = hnsw_m
+
+        # Only the chunks are kept, not the Documents, so cached indexes do not hold on
+        # to page text or to papers the document cache has evicted
+        self.urls = [document.url for document in documents]
+        self.chunks = [chunk for document in documents for chunk in document.chunks]
+        counts = [len(document.chunks) for document in documents]
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype("int64")
+        self.paper_ids = np.repeat(np.arange(len(documents)), counts)
+        embeddings = np.vstack([document.embeddings for document in documents])
+        embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+
+        total = embeddings.shape[0]
+        if index_type == "auto" or total == 0:
+            index_type = "flat" if total <= RETRIEVAL_FLAT_LIMIT else "hnsw"
+        self.index_type = index_type
+        self.index = self._build(embeddings, hnsw_m)
+
+    def _build(self, embeddings, hnsw_m):
+        total, dimension = embeddings.shape
+        if self.index_type == "flat":
+            index = faiss.IndexFlatL2(dimension)
+        elif self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dimension, hnsw_m)
+        else:
+            # ~sqrt(n) lists, but never fewer than 39 training points per list
+            nlist = max(1, min(int(4 * math.sqrt(total)), total // 39))
+            index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dimension), dimension, nlist)
+            index.train(embeddings)
+        index.add(embeddings)
+        return index
+
+    def nbytes(self):
+        size = sum(len(chunk.text) + len(chunk.heading or "") for chunk in self.chunks)
+        size += self.paper_ids.nbytes + self.offsets.nbytes
+        # FAISS keeps its own copy of the vectors, plus the graph links with HNSW
+        size += self.index.ntotal * self.index.d * 4
+        if self.index_type == "hnsw":
+            size += self.index.ntotal * 2 * self.hnsw_m * 4
+        return size
+
+    def _search_params(self, selector=None):
+        if self.index_type == "hnsw":
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=self.ef_search)
+        if self.index_type == "ivf":
+            return faiss.SearchParametersIVF(sel=selector, nprobe=self.nprobe)
+        return faiss.SearchParameters(sel=selector) if selector is not None else None
+
+    def _hits(self, distances, ids):
+        return [
+            (int(self.paper_ids[i]), self.chunks[i], float(d))
+            for d, i in zip(distances, ids) if i >= 0
+        ]
+
+    def search(self, query_embedding, k):
+        """
+        Top-k chunks across all papers as (paper_position, chunk, distance) tuples.
+        """
+        query = np.asarray(query_embedding, dtype="float32").reshape(1, -1)
+        k = min(k, self.index.ntotal)
+        if k == 0:
+            return []
+        distances, ids = self.index.search(query, k, params=self._search_params())
+        return self._hits(distances[0], ids[0])
+
+    def search_per_paper(self, query_embedding, k):
+        """
+        Top-k chunks of every paper, restricted by id range. Returns one hit list per
+        document, in the order the documents were given.
+        """
+        query = np.asarray(query_embedding, dtype="float32").reshape(1, -1)
+        results = []
+        for position in range(len(self.urls)):
+            start, stop = int(self.offsets[position]), int(self.offsets[position + 1])
+            if start == stop:
+                results.append([])
+                continue
+            # Keep a reference to the selector: the SWIG params object does not own it
+            selector = faiss.IDSelectorRange(start, stop)
+            params = self._search_params(selector)
+            distances, ids = self.index.search(query, min(k, stop - start), params=params)
+            results.append(self._hits(distances[0], ids[0]))
+        return results
@@ -0,0 +1,46 @@
+# app/agents/decoding.py
+import os
+from dataclasses import dataclass, replace
+
+# "quality" keeps the original beam search settings; "fast" decodes greedily with
+# shorter length caps, which is several times cheaper on CPU
+DECODING_PRESET = os.environ.get("DECODING_PRESET", "quality")
+
+
+@dataclass(frozen=True)
+class DecodingProfile:
+    max_length: int
+    num_beams: int = 4
+
+
+PRESETS = {
+    "quality": {
+        "answer": DecodingProfile(max_length=1024, num_beams=4),
+        "heading": DecodingProfile(max_length=100, num_beams=4),
+        "ideas": DecodingProfile(max_length=512, num_beams=4),
+    },
+    "fast": {
+        "answer": DecodingProfile(max_length=256, num_beams=1),
+        "heading": DecodingProfile(max_length=32, num_beams=1),
+        "ideas": DecodingProfile(max_length=256, num_beams=1),
+    },
+}
+
+
+def load_profiles(preset=DECODING_PRESET, environ=os.environ):
+    """
+    Decoding profiles per route ("answer", "heading", "ideas") for `preset`. Single
+    values can be overridden with DECODING_<ROUTE>_MAX_LENGTH and
+    DECODING_<ROUTE>_NUM_BEAMS, e.g. DECODING_ANSWER_NUM_BEAMS=1.
+    """
+    if preset not in PRESETS:
+        raise ValueError(f"Unknown decoding preset {preset!r}, expected one of {tuple(PRESETS)}")
+    profiles = {}
+    for route, profile in PRESETS[preset].items():
+        overrides = {}
+        for field in ("max_length", "num_beams"):
+            value = environ.get(f"DECODING_{route.upper()}_{field.upper()}")
+            if value:
+                overrides[field] = int(value)
+        profiles[route] = replace(profile, **overrides)
+    return profiles
@@ -0,0 +1,221 @@
+# app/agents/doc_cache.py
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from dataclasses import replace
+
+import faiss
+import numpy as np
+
+from app.agents.document import Document
+from app.agents.lru import LRUCache
+
+DEFAULT_CACHE_DIR = os.environ.get("PAPER_CACHE_DIR", "paper_cache")
+DEFAULT_MEMORY_BYTES = int(os.environ.get("PAPER_CACHE_MEMORY_BYTES", 256 * 1024 * 1024))
+
+
+def url_key(url):
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DocumentCache:
+    """
+    Content-addressed on-disk store for downloaded papers with an in-memory LRU in front.
+
+    Each paper lives in `<cache_dir>/<sha256(url)>/` and keeps the raw PDF, the
+    extracted page text, the chunk list, the chunk embeddings and the serialized
+    FAISS index, along with a `meta.json` that records the ETag/Last-Modified
+    headers, the PDF content hash and the fingerprint of the settings the chunks and
+    embeddings were built with.
+    Hot papers are additionally kept in memory, evicted by total byte size.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_memory_bytes=DEFAULT_MEMORY_BYTES):
+        self.cache_dir = cache_dir
+        self.memory = LRUCache(max_bytes=max_memory_bytes, sizeof=lambda document: document.nbytes())
+        self._lock = threading.Lock()
+        # url -> meta of every entry, read from disk on the first list_meta call, and
+        # the modification times that tell when entries need to be read again
+        self._metas = None
+        self._dir_mtime = None
+        self._entry_mtimes = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_dir(self, url):
+        return os.path.join(self.cache_dir, url_key(url))
+
+    def pdf_path(self, url):
+        path = os.path.join(self._entry_dir(url), "paper.pdf")
+        return path if os.path.exists(path) else None
+
+    def get_meta(self, url):
+        path = os.path.join(self._entry_dir(url), "meta.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def _read_meta(self, entry_path):
+        try:
+            with open(os.path.join(entry_path, "meta.json"), "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _refresh_metas(self):
+        # Other workers sharing the cache directory add, rebuild and remove entries
+        # too; those changes show up as new modification times, so only changed
+        # entries have their meta.json read again
+        mtime = os.stat(self.cache_dir).st_mtime_ns
+        if self._metas is not None and mtime == self._dir_mtime:
+            return
+        self._dir_mtime = mtime
+        metas = self._metas if self._metas is not None else {}
+        urls_by_name = {url_key(url): url for url in metas}
+        seen = set()
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_dir():
+                continue
+            seen.add(entry.name)
+            entry_mtime = entry.stat().st_mtime_ns
+            if self._entry_mtimes.get(entry.name) == entry_mtime:
+                continue
+            meta = self._read_meta(entry.path)
+            if meta is None:
+                # Being written or removed right now; look again on the next change
+                self._entry_mtimes.pop(entry.name, None)
+                metas.pop(urls_by_name.get(entry.name), None)
+                continue
+            self._entry_mtimes[entry.name] = entry_mtime
+            # Staging directories also hold a meta.json until they are swapped in
+            if entry.name == url_key(meta.get("url", "")):
+                metas[meta["url"]] = meta
+        for name in self._entry_mtimes.keys() - seen:
+            del self._entry_mtimes[name]
+        for name in urls_by_name.keys() - seen:
+            metas.pop(urls_by_name[name], None)
+        self._metas = metas
+
+    def list_meta(self):
+        """
+        Metadata of every paper in the cache, sorted by URL. The list is kept in
+        memory; the cache directory is only rescanned when its modification time
+        changes, and then only entries that changed are read again.
+        """
+        with self._lock:
+            self._refresh_metas()
+            metas = list(self._metas.values())
+        return sorted(metas, key=lambda meta: meta["url"])
+
+    def get(self, url, remember=True):
+        """
+        Return the cached Document for `url`, or None. With `remember=False` a paper
+        read from disk is not added to the in-memory LRU, e.g. for one-off scans.
+        """
+        document = self.memory.get(url)
+        if document is not None:
+            return document
+
+        entry_dir = self._entry_dir(url)
+        meta = self.get_meta(url)
+        if meta is None:
+            return None
+        try:
+            with open(os.path.join(entry_dir, "pages.json"), "r", encoding="utf-8") as file:
+                pages = json.load(file)
+            with open(os.path.join(entry_dir, "chunks.json"), "r", encoding="utf-8") as file:
+                chunks = json.load(file)
+            embeddings = np.load(os.path.join(entry_dir, "embeddings.npy"))
+            index = faiss.read_index(os.path.join(entry_dir, "index.faiss"))
+        except (OSError, ValueError, RuntimeError):
+            # A partially written or outdated entry is treated as a miss and rebuilt by the caller
+            return None
+
+        document = Document(url, pages, chunks, embeddings, index, meta)
+        if remember:
+            self.memory.put(url, document)
+        return document
+
+    def put(self, url, pdf_path, pages, chunks, embeddings, index, etag=None, last_modified=None, fingerprint=None):
+        """
+        Store a freshly parsed paper and return it as a Document. The PDF at
+        `pdf_path` is moved into the cache.
+        """
+        entry_dir = self._entry_dir(url)
+        meta = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_hash": file_sha256(pdf_path),
+            "fingerprint": fingerprint,
+            "cached_at": time.time(),
+        }
+
+        with self._lock:
+            # Write into a scratch directory and swap it in so readers never see half an entry
+            staging_dir = tempfile.mkdtemp(dir=self.cache_dir)
+            shutil.move(pdf_path, os.path.join(staging_dir, "paper.pdf"))
+            with open(os.path.join(staging_dir, "pages.json"), "w", encoding="utf-8") as file:
+                json.dump(pages, file)
+            with open(os.path.join(staging_dir, "chunks.json"), "w", encoding="utf-8") as file:
+                json.dump(chunks, file)
+            np.save(os.path.join(staging_dir, "embeddings.npy"), embeddings)
+            faiss.write_index(index, os.path.join(staging_dir, "index.faiss"))
+            with open(os.path.join(staging_dir, "meta.json"), "w", encoding="utf-8") as file:
+                json.dump(meta, file)
+
+            if os.path.exists(entry_dir):
+                shutil.rmtree(entry_dir)
+            os.replace(staging_dir, entry_dir)
+            if self._metas is not None:
+                self._metas[url] = meta
+
+        document = Document(url, pages, chunks, embeddings, index, meta)
+        self.memory.put(url, document)
+        return document
+
+    def mark_validated(self, url, etag=None, last_modified=None):
+        """
+        Record that the origin confirmed the cached copy is current, optionally with
+        refreshed validators, and return the cached Document.
+        """
+        with self._lock:
+            meta = self.get_meta(url)
+            if meta is None:
+                return None
+            meta["validated_at"] = time.time()
+            if etag:
+                meta["etag"] = etag
+            if last_modified:
+                meta["last_modified"] = last_modified
+            meta_path = os.path.join(self._entry_dir(url), "meta.json")
+            with open(meta_path + ".tmp", "w", encoding="utf-8") as file:
+                json.dump(meta, file)
+            os.replace(meta_path + ".tmp", meta_path)
+            if self._metas is not None:
+                self._metas[url] = meta
+
+        document = self.get(url)
+        if document is not None:
+            document = replace(document, meta=meta)
+            self.memory.put(url, document)
+        return document
+
+    def invalidate(self, url):
+        self.memory.pop(url)
+        with self._lock:
+            shutil.rmtree(self._entry_dir(url), ignore_errors=True)
+            if self._metas is not None:
+                self._metas.pop(url, None)
@@ -0,0 +1,57 @@
+# app/agents/document.py
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+
+class Chunk(NamedTuple):
+    page: int
+    text: str
+    # Title of the section the chunk starts in, detected when the PDF was parsed
+    heading: Optional[str] = None
+
+
+def _freeze_page(page):
+    # (page_num, text) or (page_num, text, [(char_offset, heading), ...])
+    page = tuple(page)
+    if len(page) > 2:
+        page = page[:2] + (tuple(tuple(heading) for heading in page[2]),)
+    return page
+
+
+@dataclass(frozen=True, eq=False)
+class Document:
+    """
+    Everything the pipeline derives from one paper: page text and section headings,
+    chunks, chunk embeddings and the FAISS index over them.
+
+    Documents are immutable once built, so a single instance can be shared by any
+    number of concurrent requests and by the document cache.
+    """
+
+    url: str
+    pages: Tuple[tuple, ...]
+    chunks: Tuple[Chunk, ...]
+    embeddings: Optional[np.ndarray] = None
+    index: object = None
+    meta: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))
+
+    def __post_init__(self):
+        object.__setattr__(self, "pages", tuple(_freeze_page(page) for page in self.pages))
+        object.__setattr__(self, "chunks", tuple(Chunk(*chunk) for chunk in self.chunks))
+        if self.embeddings is not None:
+            embeddings = np.ascontiguousarray(self.embeddings, dtype="float32")
+            embeddings.setflags(write=False)
+            object.__setattr__(self, "embeddings", embeddings)
+        if not isinstance(self.meta, MappingProxyType):
+            object.__setattr__(self, "meta", MappingProxyType(dict(self.meta)))
+
+    def nbytes(self):
+        size = sum(len(page[1]) for page in self.pages)
+        size += sum(len(chunk.text) + len(chunk.heading or "") for chunk in self.chunks)
+        if self.embeddings is not None:
+            # The flat index keeps its own copy of the vectors
+            size += 2 * self.embeddings.nbytes
+        return size
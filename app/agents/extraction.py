@@ -0,0 +1,203 @@
+# app/agents/extraction.py
+import multiprocessing
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+PDF_BACKEND = os.environ.get("PDF_BACKEND", "pymupdf")
+# Leave one core to the API process; on single-core hosts everything is parsed in-thread
+PDF_EXTRACT_PROCESSES = int(os.environ.get("PDF_EXTRACT_PROCESSES", min(4, (os.cpu_count() or 1) - 1)))
+PDF_PAGES_PER_TASK = int(os.environ.get("PDF_PAGES_PER_TASK", 16))
+
+# A line counts as a heading when its font is this much larger than the page's body text
+HEADING_SIZE_RATIO = 1.15
+HEADING_MAX_CHARS = 120
+NUMBERED_HEADING = re.compile(r"^(\d+(\.\d+)*\.?|[IVX]+\.)\s+[A-Z]")
+
+
+def _import_pymupdf():
+    try:
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf
+    return pymupdf
+
+
+def _fold(text):
+    """
+    Lowercased letters and digits of `text` (compatibility-normalized, so ligatures
+    are split) and the offset in `text` each of them came from.
+    """
+    chars, positions = [], []
+    for position, char in enumerate(text):
+        for folded in unicodedata.normalize("NFKC", char).lower():
+            if folded.isalnum():
+                chars.append(folded)
+                positions.append(position)
+    return "".join(chars), positions
+
+
+class PyMuPDFBackend:
+    """
+    Yields (page_num, text, headings) where `headings` lists (char_offset, title)
+    pairs for the section headings that start on the page. Headings come from the
+    PDF outline when there is one, otherwise from font size and weight.
+    """
+
+    name = "pymupdf"
+
+    def page_count(self, pdf_path):
+        with _import_pymupdf().open(pdf_path) as doc:
+            return doc.page_count
+
+    def iter_pages(self, pdf_path, start=0, stop=None):
+        with _import_pymupdf().open(pdf_path) as doc:
+            outline = {}
+            for _, title, page_number in doc.get_toc(simple=True):
+                outline.setdefault(page_number - 1, []).append(title.strip())
+            stop = doc.page_count if stop is None else min(stop, doc.page_count)
+            for page_num in range(start, stop):
+                page = doc[page_num]
+                if outline:
+                    text = page.get_text("text")
+                    headings = self._locate(text, outline.get(page_num, []))
+                else:
+                    text, headings = self._layout_headings(page)
+                yield page_num, text, headings
+
+    def _locate(self, text, titles):
+        # Outline titles rarely match the page text verbatim ("1 Introduction" vs
+        # "1. Introduction", ligatures, line breaks), so compare letters and digits only
+        folded, positions = _fold(text)
+        headings = []
+        for title in titles:
+            folded_title = _fold(title)[0]
+            index = folded.find(folded_title) if folded_title else -1
+            # A title that cannot be found is placed at the end of the page, so it only
+            # applies from the next page on instead of relabelling what precedes it
+            headings.append((positions[index] if index >= 0 else len(text), title))
+        return sorted(headings)
+
+    def _layout_headings(self, page):
+        lines = []
+        for block in page.get_text("dict")["blocks"]:
+            for line in block.get("lines", []):
+                spans = [span for span in line["spans"] if span["text"].strip()]
+                if spans:
+                    lines.append(spans)
+
+        sizes = Counter()
+        for spans in lines:
+            for span in spans:
+                sizes[round(span["size"], 1)] += len(span["text"])
+        body_size = sizes.most_common(1)[0][0] if sizes else 0
+
+        parts, headings, offset = [], [], 0
+        for spans in lines:
+            line_text = "".join(span["text"] for span in spans).strip()
+            size = max(span["size"] for span in spans)
+            bold = all(span["flags"] & 16 for span in spans)
+            if (len(line_text) <= HEADING_MAX_CHARS and any(char.isalpha() for char in line_text)
+                    and (size >= body_size * HEADING_SIZE_RATIO or (bold and NUMBERED_HEADING.match(line_text)))):
+                headings.append((offset, line_text))
+            parts.append(line_text)
+            offset += len(line_text) + 1
+        return "\n".join(parts), headings
+
+
+class PyPDF2Backend:
+    name = "pypdf2"
+
+    def page_count(self, pdf_path):
+        import PyPDF2
+        with open(pdf_path, "rb") as file:
+            return len(PyPDF2.PdfReader(file).pages)
+
+    def iter_pages(self, pdf_path, start=0, stop=None):
+        import PyPDF2
+        with open(pdf_path, "rb") as file:
+            pages = PyPDF2.PdfReader(file).pages
+            stop = len(pages) if stop is None else min(stop, len(pages))
+            for page_num in range(start, stop):
+                # No layout information; headings fall back to LLM inference if enabled
+                yield page_num, pages[page_num].extract_text() or "", []
+
+
+BACKENDS = {backend.name: backend for backend in (PyMuPDFBackend, PyPDF2Backend)}
+
+
+def get_backend(name=PDF_BACKEND):
+    """
+    Returns an instance of the named backend, falling back to PyPDF2 when PyMuPDF is
+    not installed.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown PDF backend {name!r}, expected one of {sorted(BACKENDS)}")
+    if name == PyMuPDFBackend.name:
+        try:
+            _import_pymupdf()
+        except ImportError:
+            name = PyPDF2Backend.name
+    return BACKENDS[name]()
+
+
+def extract_page_range(pdf_path, backend_name, start, stop):
+    # Runs inside worker processes, so it has to be a picklable module-level function
+    return list(get_backend(backend_name).iter_pages(pdf_path, start, stop))
+
+
+class PDFExtractor:
+    """
+    Streams (page_num, text, headings) tuples out of PDFs.
+
+    Documents of up to `pages_per_task` pages are parsed directly on the calling
+    thread. Longer documents are split into page ranges that are parsed in a shared
+    process pool, and pages are yielded in order as soon as their range is done, so
+    chunking and embedding can start before the whole document has been parsed.
+    Concurrent callers (e.g. multi-paper requests) share the same pool.
+    """
+
+    def __init__(self, backend=PDF_BACKEND, processes=PDF_EXTRACT_PROCESSES, pages_per_task=PDF_PAGES_PER_TASK):
+        self.backend = get_backend(backend)
+        self.processes = processes
+        self.pages_per_task = pages_per_task
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn rather than fork: the parent process runs model and HTTP threads
+                self._pool = ProcessPoolExecutor(max_workers=self.processes,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def iter_pages(self, pdf_path):
+        page_count = self.backend.page_count(pdf_path)
+        if self.processes <= 0 or page_count <= self.pages_per_task:
+            yield from self.backend.iter_pages(pdf_path)
+            return
+
+        pool = self._get_pool()
+        futures = [
+            pool.submit(extract_page_range, pdf_path, self.backend.name, start, start + self.pages_per_task)
+            for start in range(0, page_count, self.pages_per_task)
+        ]
+        try:
+            for future in futures:
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def extract_pages(self, pdf_path):
+        return list(self.iter_pages(pdf_path))
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,107 @@
+# app/agents/fetcher.py
+import os
+import tempfile
+import time
+from typing import NamedTuple, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+FETCH_POOL_SIZE = int(os.environ.get("FETCH_POOL_SIZE", 16))
+FETCH_MAX_PARALLEL = int(os.environ.get("FETCH_MAX_PARALLEL", 4))
+FETCH_MAX_RETRIES = int(os.environ.get("FETCH_MAX_RETRIES", 3))
+FETCH_TIMEOUT = float(os.environ.get("FETCH_TIMEOUT", 30))
+# Cached papers are revalidated with a conditional request once they are this old
+FETCH_REVALIDATE_AFTER = float(os.environ.get("FETCH_REVALIDATE_AFTER", 24 * 3600))
+
+
+class _BodyInterrupted(Exception):
+    """A response body that broke off after the headers arrived; the cause is the original error."""
+
+
+class FetchResult(NamedTuple):
+    url: str
+    # Path of the downloaded PDF, or of the cached copy when the server answered 304
+    path: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    not_modified: bool
+
+
+class PaperFetcher:
+    """
+    Downloads PDFs over a pooled HTTP session.
+
+    Bodies are streamed to disk in `chunk_size` pieces instead of being held in memory.
+    Connection errors and 429/5xx responses are retried with exponential backoff, and
+    papers already in the document cache are fetched conditionally with
+    If-None-Match/If-Modified-Since so unchanged papers cost a single 304.
+    """
+
+    def __init__(self, cache=None, pool_size=FETCH_POOL_SIZE, max_parallel=FETCH_MAX_PARALLEL,
+                 max_retries=FETCH_MAX_RETRIES, backoff_factor=0.5, timeout=FETCH_TIMEOUT,
+                 revalidate_after=FETCH_REVALIDATE_AFTER, chunk_size=64 * 1024):
+        self.cache = cache
+        self.max_parallel = max_parallel
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.revalidate_after = revalidate_after
+        self.chunk_size = chunk_size
+
+        retry = Retry(total=max_retries, backoff_factor=backoff_factor,
+                      status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET", "HEAD"),
+                      respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def is_stale(self, meta):
+        validated_at = meta.get("validated_at") or meta.get("cached_at") or 0
+        return time.time() - validated_at >= self.revalidate_after
+
+    def _conditional_headers(self, url):
+        if self.cache is None or self.cache.pdf_path(url) is None:
+            return {}
+        meta = self.cache.get_meta(url) or {}
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def fetch(self, url):
+        headers = self._conditional_headers(url)
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._fetch_once(url, headers)
+            except _BodyInterrupted as interrupted:
+                # The adapter retries connects and 429/5xx; only bodies cut off mid-download
+                # are retried here, so neither layer multiplies the other's attempts
+                if attempt == self.max_retries:
+                    raise interrupted.__cause__
+                time.sleep(self.backoff_factor * (2 ** attempt))
+
+    def _fetch_once(self, url, headers):
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 304:
+                return FetchResult(url, self.cache.pdf_path(url), response.headers.get("ETag"),
+                                   response.headers.get("Last-Modified"), True)
+            response.raise_for_status()
+
+            temp_pdf = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
+            try:
+                with temp_pdf:
+                    for block in response.iter_content(chunk_size=self.chunk_size):
+                        temp_pdf.write(block)
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as exc:
+                os.remove(temp_pdf.name)
+                raise _BodyInterrupted() from exc
+            except BaseException:
+                os.remove(temp_pdf.name)
+                raise
+            return FetchResult(url, temp_pdf.name, response.headers.get("ETag"),
+                               response.headers.get("Last-Modified"), False)
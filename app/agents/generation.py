@@ -0,0 +1,211 @@
+# app/agents/generation.py
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from app.metrics import metrics
+from app.model_registry import registry, DEFAULT_GENERATION_MODEL, GENERATION_BACKEND
+
+MAX_BATCH_SIZE = int(os.environ.get("GENERATION_MAX_BATCH_SIZE", 8))
+MAX_WAIT_MS = float(os.environ.get("GENERATION_MAX_WAIT_MS", 20))
+MAX_QUEUE_SIZE = int(os.environ.get("GENERATION_MAX_QUEUE_SIZE", 64))
+# Streamed generations run unbatched on their own threads; at most this many at once
+MAX_STREAMS = int(os.environ.get("GENERATION_MAX_STREAMS", 4))
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the generation queue is at capacity and the request is rejected."""
+
+
+class _Request:
+    def __init__(self, prompt, max_length, num_beams):
+        self.prompt = prompt
+        self.max_length = max_length
+        self.num_beams = num_beams
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class GenerationBatcher:
+    """
+    Collects generation requests from concurrent callers into padded batches.
+
+    A dedicated worker thread takes the first queued prompt, waits up to `max_wait_ms`
+    for more to arrive (or until `max_batch_size` is reached) and runs them through a
+    single `generate` call. Prompts are only batched with others that use the same
+    decoding parameters. The queue is bounded: once `max_queue_size` prompts are
+    waiting, `submit` raises QueueFullError so callers can shed load. Likewise
+    `stream` raises QueueFullError while `max_streams` streams are generating.
+    """
+
+    def __init__(self, model_name=DEFAULT_GENERATION_MODEL, max_batch_size=MAX_BATCH_SIZE,
+                 max_wait_ms=MAX_WAIT_MS, max_queue_size=MAX_QUEUE_SIZE, backend=GENERATION_BACKEND,
+                 max_streams=MAX_STREAMS):
+        self.model_name = model_name
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue_size = max_queue_size
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self.max_streams = max_streams
+        self._streams = threading.BoundedSemaphore(max_streams)
+        self.active_streams = 0
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+        self.batches = 0
+        self.requests = 0
+        self.rejected = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        # Counters are also updated by streaming callers, outside the worker thread
+        self._stats_lock = threading.Lock()
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="generation-batcher", daemon=True)
+                self._worker.start()
+
+    def submit(self, prompt, max_length, num_beams=4):
+        self._ensure_worker()
+        request = _Request(prompt, max_length, num_beams)
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            self.rejected += 1
+            raise QueueFullError(f"Generation queue is full ({self.max_queue_size} pending requests)")
+        return request.future
+
+    def generate(self, prompt, max_length, num_beams=4):
+        return self.submit(prompt, max_length, num_beams).result()
+
+    def generate_batch(self, prompts, max_length, num_beams=4):
+        futures = [self.submit(prompt, max_length, num_beams) for prompt in prompts]
+        return [future.result() for future in futures]
+
+    def stream(self, prompt, max_length):
+        """
+        Yield decoded text pieces for `prompt` as they are produced. Streaming needs
+        greedy decoding and runs outside the batch queue, so the first tokens arrive
+        without waiting for other requests.
+        """
+        from transformers import TextIteratorStreamer
+
+        if not self._streams.acquire(blocking=False):
+            with self._stats_lock:
+                self.rejected += 1
+            raise QueueFullError(f"Too many streaming generations ({self.max_streams} running)")
+        with self._stats_lock:
+            self.active_streams += 1
+
+        def release():
+            with self._stats_lock:
+                self.active_streams -= 1
+            self._streams.release()
+
+        try:
+            tokenizer, model = registry.generator(self.model_name, self.backend)
+            inputs = tokenizer(prompt, return_tensors="pt", truncation=True).to(model.device)
+        except BaseException:
+            release()
+            raise
+        pieces = []
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        errors = []
+
+        def run():
+            import torch
+            try:
+                with torch.inference_mode():
+                    model.generate(**inputs, max_length=max_length, num_beams=1, streamer=streamer)
+            except Exception as exc:
+                errors.append(exc)
+                # Unblock the consumer, which would otherwise wait for tokens forever
+                streamer.end()
+            finally:
+                # Released when generation ends, even if the consumer stopped reading
+                release()
+
+        thread = threading.Thread(target=run, name="generation-stream", daemon=True)
+        thread.start()
+        for text in streamer:
+            if text:
+                pieces.append(text)
+                yield text
+        thread.join()
+        if errors:
+            raise errors[0]
+        output_tokens = len(tokenizer("".join(pieces), add_special_tokens=False)["input_ids"])
+        with self._stats_lock:
+            self.input_tokens += int(inputs["input_ids"].shape[1])
+            self.output_tokens += output_tokens
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_queue_size": self.max_queue_size,
+            "max_batch_size": self.max_batch_size,
+            "backend": self.backend,
+            "active_streams": self.active_streams,
+            "max_streams": self.max_streams,
+            "batches": self.batches,
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+        }
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            groups = {}
+            for request in batch:
+                groups.setdefault((request.max_length, request.num_beams), []).append(request)
+            for (max_length, num_beams), requests in groups.items():
+                self._run_batch(requests, max_length, num_beams)
+
+    def _run_batch(self, requests, max_length, num_beams):
+        import torch
+
+        started = time.monotonic()
+        for request in requests:
+            metrics.observe_stage("generation_queue_wait", started - request.enqueued_at)
+        try:
+            tokenizer, model = registry.generator(self.model_name, self.backend)
+            inputs = tokenizer([request.prompt for request in requests], return_tensors="pt",
+                               truncation=True, padding=True).to(model.device)
+            with torch.inference_mode(), metrics.stage("generation_batch"):
+                outputs = model.generate(**inputs, max_length=max_length, num_beams=num_beams,
+                                         early_stopping=num_beams > 1)
+            texts = tokenizer.batch_decode(outputs, skip_special_tokens=True)
+            # Padding does not count; the pad token also starts every T5 decoder output
+            output_tokens = int((outputs != tokenizer.pad_token_id).sum())
+        except Exception as exc:
+            for request in requests:
+                request.future.set_exception(exc)
+            return
+
+        with self._stats_lock:
+            self.batches += 1
+            self.requests += len(requests)
+            self.input_tokens += int(inputs["attention_mask"].sum())
+            self.output_tokens += output_tokens
+        for request, text in zip(requests, texts):
+            request.future.set_result(text)
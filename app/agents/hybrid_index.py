@@ -0,0 +1,280 @@
+# app/agents/hybrid_index.py
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+# "dense" ranks chunks with the FAISS corpus index, "hybrid" with HybridIndex
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "dense")
+RETRIEVAL_MODES = ("dense", "hybrid")
+# Chunks kept by the BM25 prefilter for dense re-scoring, per search (or per paper)
+RETRIEVAL_CANDIDATES = int(os.environ.get("RETRIEVAL_CANDIDATES", 200))
+# "rrf" (reciprocal rank fusion) or "linear" (weighted sum of min-max normalized scores)
+RETRIEVAL_FUSION = os.environ.get("RETRIEVAL_FUSION", "rrf")
+# Weight of the dense score with linear fusion; the lexical score gets the rest
+RETRIEVAL_FUSION_ALPHA = float(os.environ.get("RETRIEVAL_FUSION_ALPHA", 0.5))
+
+FUSION_METHODS = ("rrf", "linear")
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+
+class HybridIndex:
+    """
+    Two-stage retrieval over the chunks of several Documents.
+
+    An inverted index of term frequencies shortlists the `candidates` chunks with
+    the highest BM25 score for the question. Only the shortlist is re-scored against
+    the query embedding, using the embeddings stored with each Document, and the
+    lexical and dense rankings are fused. If the question shares fewer than k terms
+    with the allowed chunks, the shortlist is topped up by exact dense search over them.
+
+    Papers can be added and removed while the index is in use. Each added paper gets
+    the next position and a contiguous chunk id range, as in CorpusIndex, and every
+    search can be restricted to a subset of positions. BM25 weights are computed at
+    query time from live document frequencies, so adding or removing a paper only
+    touches its own chunks; removed chunks are dropped from the arrays once they
+    outnumber the live ones.
+    """
+
+    def __init__(self, documents=(), candidates=RETRIEVAL_CANDIDATES, fusion=RETRIEVAL_FUSION,
+                 alpha=RETRIEVAL_FUSION_ALPHA):
+        if fusion not in FUSION_METHODS:
+            raise ValueError(f"Unknown fusion method {fusion!r}, expected one of {FUSION_METHODS}")
+        self.candidates = candidates
+        self.fusion = fusion
+        self.alpha = alpha
+
+        # Per position: the paper URL (kept after removal) and its chunk id range
+        self.urls = []
+        self.positions = {}
+        self._ranges = []
+        # Per chunk id, grown by doubling; ids past `_size` are unused capacity
+        self.chunks = []
+        self._size = 0
+        self._paper_ids = np.zeros(0, dtype="int64")
+        self._lengths = np.zeros(0, dtype="float32")
+        self._alive = np.zeros(0, dtype=bool)
+        self._embeddings = None
+        self._live_chunks = 0
+        self._live_length = 0.0
+        # term -> list of (chunk ids, term frequencies) segments, one per added paper
+        # until the term is next queried
+        self.postings = {}
+        self._lock = threading.RLock()
+        self.add_documents(documents)
+
+    def __len__(self):
+        return self._live_chunks
+
+    def nbytes(self):
+        with self._lock:
+            size = sum(len(chunk.text) + len(chunk.heading or "") for chunk in self.chunks)
+            size += self._paper_ids.nbytes + self._lengths.nbytes + self._alive.nbytes
+            size += self._embeddings.nbytes if self._embeddings is not None else 0
+            size += sum(ids.nbytes + frequencies.nbytes for segments in self.postings.values()
+                        for ids, frequencies in segments)
+            return size
+
+    def _reserve(self, count, dimension):
+        if self._embeddings is None:
+            self._embeddings = np.zeros((0, dimension), dtype="float32")
+        elif self._embeddings.shape[1] != dimension:
+            raise ValueError(f"Embedding dimension {dimension} does not match the index ({self._embeddings.shape[1]})")
+        needed = self._size + count
+        if needed <= len(self._alive):
+            return
+        capacity = max(needed, 2 * len(self._alive), 1024)
+
+        def grow(array):
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            return grown
+
+        self._paper_ids, self._lengths = grow(self._paper_ids), grow(self._lengths)
+        self._alive, self._embeddings = grow(self._alive), grow(self._embeddings)
+
+    def add_documents(self, documents):
+        """
+        Index `documents`, each at the next position. A URL that is already indexed
+        keeps its old chunks until it is removed, but `positions` points at the new ones.
+        """
+        with self._lock:
+            for document in documents:
+                count = len(document.chunks)
+                start = self._size
+                if count:
+                    self._reserve(count, document.embeddings.shape[1])
+                    stop = start + count
+                    self._embeddings[start:stop] = document.embeddings
+                    self._paper_ids[start:stop] = len(self.urls)
+                    self._alive[start:stop] = True
+                    self._add_postings(document.chunks, start)
+                    self.chunks.extend(document.chunks)
+                    self._size = stop
+                    self._live_chunks += count
+                    self._live_length += float(self._lengths[start:stop].sum())
+                self.positions[document.url] = len(self.urls)
+                self.urls.append(document.url)
+                self._ranges.append((start, self._size))
+
+    def _add_postings(self, chunks, start):
+        postings = {}
+        for chunk_id, chunk in enumerate(chunks, start):
+            terms = Counter(tokenize(chunk.text))
+            self._lengths[chunk_id] = sum(terms.values())
+            for term, frequency in terms.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(chunk_id)
+                postings[term][1].append(frequency)
+        for term, (ids, frequencies) in postings.items():
+            self.postings.setdefault(term, []).append(
+                (np.array(ids, dtype="int64"), np.array(frequencies, dtype="float32")))
+
+    def remove(self, url):
+        """
+        Drop the paper indexed under `url`. Returns False if it is not in the index.
+        """
+        with self._lock:
+            position = self.positions.pop(url, None)
+            if position is None:
+                return False
+            start, stop = self._ranges[position]
+            self._ranges[position] = (start, start)
+            self._alive[start:stop] = False
+            self._live_chunks -= stop - start
+            self._live_length -= float(self._lengths[start:stop].sum())
+            if self._size - self._live_chunks > max(self._live_chunks, 1024):
+                self._compact()
+            return True
+
+    def _compact(self):
+        keep = np.flatnonzero(self._alive[:self._size])
+        new_ids = np.full(self._size, -1, dtype="int64")
+        new_ids[keep] = np.arange(len(keep))
+        self.chunks = [self.chunks[i] for i in keep]
+        self._paper_ids = self._paper_ids[keep]
+        self._lengths = self._lengths[keep]
+        self._alive = self._alive[keep]
+        self._embeddings = self._embeddings[keep]
+        # Only whole papers are removed, so every live range stays contiguous
+        ranges = []
+        for start, stop in self._ranges:
+            new_start = int(new_ids[start]) if stop > start else 0
+            ranges.append((new_start, new_start + stop - start))
+        self._ranges = ranges
+        for term in list(self.postings):
+            ids, frequencies = self._posting(term)
+            ids = new_ids[ids]
+            live = ids >= 0
+            if live.any():
+                self.postings[term] = [(ids[live], frequencies[live])]
+            else:
+                del self.postings[term]
+        self._size = len(keep)
+
+    def _posting(self, term):
+        segments = self.postings.get(term)
+        if not segments:
+            return None
+        if len(segments) > 1:
+            segments[:] = [(np.concatenate([ids for ids, _ in segments]),
+                            np.concatenate([frequencies for _, frequencies in segments]))]
+        return segments[0]
+
+    def lexical_scores(self, question):
+        """
+        BM25 score of every chunk id for `question` (zero for chunks without a shared
+        term; removed chunks may score but are never allowed in a search).
+        """
+        scores = np.zeros(self._size, dtype="float32")
+        average_length = max(self._live_length / max(self._live_chunks, 1), 1.0)
+        for term in set(tokenize(question)):
+            posting = self._posting(term)
+            if posting is None:
+                continue
+            ids, frequencies = posting
+            count = int(np.count_nonzero(self._alive[ids]))
+            if not count:
+                continue
+            idf = math.log(1 + (self._live_chunks - count + 0.5) / (count + 0.5))
+            norms = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[ids] / average_length)
+            # Chunk ids are unique within a posting list, so plain fancy indexing adds correctly
+            scores[ids] += idf * frequencies * (BM25_K1 + 1) / (frequencies + norms)
+        return scores
+
+    def _distances(self, query, ids):
+        difference = self._embeddings[ids] - query
+        return np.einsum("ij,ij->i", difference, difference)
+
+    def _shortlist(self, lexical, allowed, query, k):
+        matched = allowed[lexical[allowed] > 0]
+        if len(matched) > self.candidates:
+            matched = matched[np.argpartition(-lexical[matched], self.candidates - 1)[:self.candidates]]
+        if len(matched) >= min(k, len(allowed)):
+            return matched
+        # Too few lexical matches: fill up with the nearest unmatched chunks
+        rest = np.setdiff1d(allowed, matched, assume_unique=True)
+        nearest = rest[np.argsort(self._distances(query, rest))[:k - len(matched)]]
+        return np.concatenate([matched, nearest])
+
+    def _fuse(self, lexical, distances):
+        if self.fusion == "rrf":
+            lexical_rank = np.empty(len(lexical))
+            lexical_rank[np.argsort(-lexical, kind="stable")] = np.arange(len(lexical))
+            dense_rank = np.empty(len(distances))
+            dense_rank[np.argsort(distances, kind="stable")] = np.arange(len(distances))
+            return 1 / (RRF_K + 1 + lexical_rank) + 1 / (RRF_K + 1 + dense_rank)
+
+        def normalize(values):
+            spread = values.max() - values.min()
+            return (values - values.min()) / spread if spread > 0 else np.ones_like(values)
+
+        return self.alpha * normalize(-distances) + (1 - self.alpha) * normalize(lexical)
+
+    def _rank(self, lexical, allowed, query, k):
+        if len(allowed) == 0 or k <= 0:
+            return []
+        ids = self._shortlist(lexical, allowed, query, k)
+        fused = self._fuse(lexical[ids], self._distances(query, ids))
+        order = np.argsort(-fused, kind="stable")[:k]
+        return [(int(self._paper_ids[ids[i]]), self.chunks[ids[i]], float(fused[i])) for i in order]
+
+    def _paper_range(self, position):
+        return np.arange(*self._ranges[position], dtype="int64")
+
+    def search(self, question, query_embedding, k, papers=None):
+        """
+        Top-k chunks across all papers, or only the papers at the positions in
+        `papers`, as (paper_position, chunk, fused_score) tuples, best first.
+        """
+        query = np.asarray(query_embedding, dtype="float32").reshape(-1)
+        with self._lock:
+            if papers is None:
+                allowed = np.flatnonzero(self._alive[:self._size])
+            else:
+                allowed = np.concatenate([self._paper_range(position) for position in sorted(set(papers))] or [[]])
+                allowed = allowed.astype("int64")
+            return self._rank(self.lexical_scores(question), allowed, query, k)
+
+    def search_per_paper(self, question, query_embedding, k, papers=None):
+        """
+        Top-k chunks of every paper. Returns one hit list per position, in the order
+        the documents were added; papers outside `papers` get an empty list.
+        """
+        query = np.asarray(query_embedding, dtype="float32").reshape(-1)
+        with self._lock:
+            lexical = self.lexical_scores(question)
+            selected = set(range(len(self.urls))) if papers is None else set(papers)
+            return [self._rank(lexical, self._paper_range(position), query, k) if position in selected else []
+                    for position in range(len(self.urls))]
@@ -0,0 +1,193 @@
+# app/agents/ingest_queue.py
+import itertools
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from app.agents.generation import QueueFullError
+from app.metrics import metrics
+
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", 2))
+INGEST_MAX_QUEUE = int(os.environ.get("INGEST_MAX_QUEUE", 256))
+INGEST_SUMMARIES = os.environ.get("INGEST_SUMMARIES", "1") == "1"
+# Finished jobs are kept for status queries until this many newer jobs exist
+INGEST_JOB_HISTORY = int(os.environ.get("INGEST_JOB_HISTORY", 1024))
+
+# Lower runs first: papers a user asked for beat papers prefetched from search results
+PRIORITY_INTERACTIVE = 0
+PRIORITY_PREFETCH = 10
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class IngestJob:
+    def __init__(self, url, priority, summarize):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.priority = priority
+        self.summarize = summarize
+        self.status = "queued"
+        self.stage = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id, "paper_url": self.url, "priority": self.priority, "summarize": self.summarize,
+            "status": self.status, "stage": self.stage, "error": self.error, "created_at": self.created_at,
+            "started_at": self.started_at, "finished_at": self.finished_at,
+        }
+
+
+class IngestQueue:
+    """
+    Background workers that load papers into the pipeline caches before anyone asks
+    about them: download, text and headings, chunks, embeddings and (optionally) the
+    summary.
+
+    Jobs are deduplicated by paper URL: enqueueing a paper that is already queued or
+    running returns the existing job, raising its priority if needed. A done job is
+    only reused while its paper is still in the document cache and fresh; otherwise
+    the paper is queued again. At most `max_queue` jobs wait at a time; beyond that
+    `enqueue` raises QueueFullError, or skips the paper when `best_effort` is set.
+    Interactive requests for a paper that is being ingested wait on the pipeline's
+    per-URL lock instead of loading it twice.
+    """
+
+    def __init__(self, pipeline, workers=INGEST_WORKERS, max_queue=INGEST_MAX_QUEUE,
+                 summarize=INGEST_SUMMARIES, history=INGEST_JOB_HISTORY):
+        self.pipeline = pipeline
+        self.workers = workers
+        self.max_queue = max_queue
+        self.summarize = summarize
+        self.history = history
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._jobs = OrderedDict()
+        self._jobs_by_url = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stopped = False
+
+        self.completed = 0
+        self.failed = 0
+
+    def _ensure_workers(self):
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._run, name=f"ingest-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def pending(self):
+        return sum(1 for job in self._jobs.values() if job.status == "queued")
+
+    def enqueue(self, urls, priority=PRIORITY_INTERACTIVE, summarize=None, best_effort=False):
+        """
+        Queue the papers at `urls` (PDF URLs) and return their jobs, in order. Papers
+        skipped because the queue is full (best_effort only) are left out.
+        """
+        summarize = self.summarize if summarize is None else summarize
+        jobs = []
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError("The ingest queue has been shut down")
+            self._ensure_workers()
+            for url in urls:
+                job = self._jobs_by_url.get(url)
+                if job is not None and job.status == "done" and not self._is_warm(url):
+                    # Evicted, invalidated or due for revalidation since the job ran
+                    job = None
+                if job is not None and job.status != "failed" and (job.summarize or not summarize):
+                    if job.status == "queued" and priority < job.priority:
+                        # Queue it again ahead of its old position; the stale entry is skipped
+                        job.priority = priority
+                        self._queue.put((priority, next(self._order), job.id))
+                    jobs.append(job)
+                    continue
+
+                if self.pending() >= self.max_queue:
+                    if best_effort:
+                        continue
+                    raise QueueFullError(f"Ingest queue is full ({self.max_queue} pending papers)")
+                job = IngestJob(url, priority, summarize)
+                self._jobs[job.id] = job
+                self._jobs_by_url[url] = job
+                self._queue.put((priority, next(self._order), job.id))
+                jobs.append(job)
+            self._trim_history()
+        return jobs
+
+    def _is_warm(self, url):
+        meta = self.pipeline.cache.get_meta(url)
+        return meta is not None and self.pipeline.is_fresh(meta)
+
+    def _trim_history(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status not in ACTIVE_STATUSES]
+        for job_id in finished[:max(len(self._jobs) - self.history, 0)]:
+            job = self._jobs.pop(job_id)
+            if self._jobs_by_url.get(job.url) is job:
+                del self._jobs_by_url[job.url]
+
+    def get(self, job_id):
+        job = self._jobs.get(job_id)
+        return job.to_dict() if job is not None else None
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+    def _next_job(self):
+        while True:
+            priority, _, job_id = self._queue.get()
+            if job_id is None:
+                return None
+            with self._lock:
+                job = self._jobs.get(job_id)
+                # Skip entries superseded by a priority bump or dropped from history
+                if job is None or job.status != "queued" or job.priority != priority:
+                    continue
+                job.status = "running"
+                job.started_at = time.time()
+                return job
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                with metrics.stage("ingest_job"):
+                    document = self.pipeline.load_paper(job.url, on_progress=lambda stage: setattr(job, "stage", stage))
+                    if job.summarize:
+                        job.stage = "summarizing"
+                        self.pipeline.summarize_document(document)
+            except Exception as exc:
+                with self._lock:
+                    job.status, job.error = "failed", str(exc)
+                    self.failed += 1
+            else:
+                with self._lock:
+                    job.status, job.stage = "done", "ready"
+                    self.completed += 1
+            job.finished_at = time.time()
+
+    def shutdown(self):
+        with self._lock:
+            self._stopped = True
+            for _ in self._threads:
+                # Sorts after every real job, so queued work is finished first
+                self._queue.put((float("inf"), next(self._order), None))
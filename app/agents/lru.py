@@ -0,0 +1,75 @@
+# app/agents/lru.py
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used mapping.
+
+    Entries are evicted once either `max_items` or `max_bytes` is exceeded. The
+    byte size of each entry is computed with `sizeof`, which defaults to 1 so that
+    `max_bytes` degrades to an item count when no size function is given.
+    """
+
+    def __init__(self, max_items=None, max_bytes=None, sizeof=None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: 1)
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._sizes.pop(key)
+                del self._entries[key]
+            if self.max_bytes is not None and size > self.max_bytes:
+                # Never keep a single entry that is larger than the whole budget
+                return
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._total_bytes += size
+            self._evict()
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._total_bytes -= self._sizes.pop(key)
+            return self._entries.pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._total_bytes = 0
+
+    def _evict(self):
+        while self._entries and (
+            (self.max_items is not None and len(self._entries) > self.max_items)
+            or (self.max_bytes is not None and self._total_bytes > self.max_bytes)
+        ):
+            key, _ = self._entries.popitem(last=False)
+            self._total_bytes -= self._sizes.pop(key)
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
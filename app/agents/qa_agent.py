@@ -1,119 +1,401 @@
 
-import requests
+import itertools
 import os
-import PyPDF2
+import queue
+import shutil
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
 import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
-from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
-from db.db_init import Neo4jDatabase
-db = Neo4jDatabase("bolt://localhost:7687", "neo4j", "Ashu@13016")
+from db.db_init import get_database, parse_year
+from app.agents.answer_cache import SemanticAnswerCache
+from app.agents.chunking import TokenChunker, chunk_token_budget, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+from app.agents.corpus_index import CorpusIndex, RETRIEVAL_INDEX_TYPE
+from app.agents.decoding import load_profiles
+from app.agents.doc_cache import DocumentCache, file_sha256
+from app.agents.extraction import PDFExtractor
+from app.agents.fetcher import PaperFetcher
+from app.agents.generation import GenerationBatcher
+from app.agents.hybrid_index import HybridIndex, RETRIEVAL_MODE, RETRIEVAL_MODES
+from app.agents.lru import LRUCache
+from app.agents.summarization import MapReduceSummarizer
+from app.agents.summary_store import SummaryStore
+from app.metrics import metrics, in_context
+from app.model_registry import registry, DEFAULT_EMBEDDING_MODEL, DEFAULT_GENERATION_MODEL, GENERATION_BACKEND
+db = get_database()
 
+DOCUMENT_LOADS = metrics.counter("research_agent_document_loads_total",
+                                 "Papers served from the document cache or fetched and parsed", labels=("result",))
 
-# Initialize the models
-embedding_model_name = "all-MiniLM-L6-v2"
-flan_t5_model_name = "google/flan-t5-base"
+# Where answer source headings come from: "metadata" uses the section headings found
+# when the PDF was parsed, "fallback" also asks the generator when a chunk has none,
+# and "llm" always asks the generator (one extra generation per answer)
+HEADING_MODE = os.environ.get("HEADING_MODE", "metadata")
+HEADING_MODES = ("metadata", "fallback", "llm")
 
-# Load the Sentence Transformer model for embeddings
-embedding_model = SentenceTransformer(embedding_model_name)
+# Multi-paper answers take the top-k chunks of every paper or of all papers together
+ANSWER_SCOPES = ("per_paper", "global")
+
+# Chunks per embedding model call when a paper is indexed
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 64))
+
+# Memory for the cross-paper indexes of recently used paper sets, per retrieval mode
+INDEX_CACHE_BYTES = int(os.environ.get("INDEX_CACHE_BYTES", 128 * 1024 * 1024))
+
+# Bump when extraction or chunking changes what a cached Document holds, so papers
+# cached by an older version are rebuilt
+DOCUMENT_FORMAT_VERSION = 2
+
+
+class PaperNotFoundError(LookupError):
+    """Raised when requested titles match no paper in the database."""
+
+    def __init__(self, titles):
+        self.titles = list(titles)
+        super().__init__("No paper found for " + ", ".join(repr(title) for title in self.titles))
+
+
+def paper_pdf_url(url):
+    """
+    PDF URL the pipeline loads for a paper URL stored in the database.
+    """
+    return f"{url}.pdf"
+
+
+def paper_url(pdf_url):
+    """
+    Database URL of a paper, the inverse of paper_pdf_url.
+    """
+    return pdf_url.removesuffix(".pdf")
 
-# Load the FLAN-T5 model and tokenizer for text generation
-tokenizer = AutoTokenizer.from_pretrained(flan_t5_model_name)
-flan_t5_model = AutoModelForSeq2SeqLM.from_pretrained(flan_t5_model_name)
 
 class RAGPipeline:
-    def __init__(self, embedding_model_name="all-MiniLM-L6-v2", model_name="google/flan-t5-base"):
-        # Load models
-        self.embedding_model = SentenceTransformer(embedding_model_name)
+    def __init__(self, embedding_model_name=DEFAULT_EMBEDDING_MODEL, model_name=DEFAULT_GENERATION_MODEL, cache=None,
+                 generator=None, fetcher=None, extractor=None, summary_settings=None, summary_store=None,
+                 index_type=RETRIEVAL_INDEX_TYPE, answer_cache=None, heading_mode=HEADING_MODE,
+                 backend=GENERATION_BACKEND, decoding_profiles=None, chunk_tokens=CHUNK_MAX_TOKENS,
+                 chunk_overlap=CHUNK_OVERLAP_TOKENS, embed_batch_size=EMBED_BATCH_SIZE, retrieval=RETRIEVAL_MODE):
+        if heading_mode not in HEADING_MODES:
+            raise ValueError(f"Unknown heading mode {heading_mode!r}, expected one of {HEADING_MODES}")
+        if retrieval not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode {retrieval!r}, expected one of {RETRIEVAL_MODES}")
+        self.heading_mode = heading_mode
+
+        # Models are loaded lazily through the shared registry
+        self.embedding_model_name = embedding_model_name
         self.model_name = model_name
 
-        # FAISS index to store embeddings
-        self.index = None
-        self.chunks_with_context = []
+        # Generation requests from concurrent callers are micro-batched on a worker thread,
+        # using eager torch, int8-quantized torch or ONNX Runtime
+        self.generator = generator if generator is not None else GenerationBatcher(model_name, backend=backend)
+        # Beam width and length cap per route ("answer", "heading", "ideas")
+        self.decoding = decoding_profiles if decoding_profiles is not None else load_profiles()
+        self.summarizer = MapReduceSummarizer(self.generator, model_name, summary_settings)
+
+        # Chunks are windows of embedding-tokenizer tokens; 0 sizes them from the models'
+        # context windows when the first paper is chunked
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap = chunk_overlap
+        self.embed_batch_size = embed_batch_size
+        self._chunker = None
+
+        # Summaries are memoized per (paper, model, generation parameters)
+        self.summary_store = summary_store if summary_store is not None else SummaryStore()
+
+        # Parsed papers are reused across requests instead of being downloaded again
+        self.cache = cache if cache is not None else DocumentCache()
+
+        # Pooled HTTP session; multi-paper requests load up to fetcher.max_parallel papers at once
+        self.fetcher = fetcher if fetcher is not None else PaperFetcher(self.cache)
+        self._loader = ThreadPoolExecutor(max_workers=self.fetcher.max_parallel, thread_name_prefix="paper-loader")
+
+        # PyMuPDF by default; long PDFs are parsed in a process pool and streamed page by page
+        self.extractor = extractor if extractor is not None else PDFExtractor()
+
+        # Answers to near-duplicate questions on the same paper are served from here
+        self.answer_cache = answer_cache if answer_cache is not None else SemanticAnswerCache()
+
+        # Cross-paper indexes for recently used paper sets
+        self.index_type = index_type
+        self._corpus_indexes = LRUCache(max_bytes=INDEX_CACHE_BYTES, sizeof=lambda index: index.nbytes())
+        # Multi-paper retrieval ranks chunks with the FAISS corpus index ("dense") or a
+        # BM25 prefilter plus dense re-scoring ("hybrid"); search_chunks always uses the latter
+        self.retrieval = retrieval
+        self._hybrid_indexes = LRUCache(max_bytes=INDEX_CACHE_BYTES, sizeof=lambda index: index.nbytes())
+        # One HybridIndex over every cached paper for search_chunks, with the
+        # (content hash, cached_at) version of each paper it holds
+        self._search_index = HybridIndex()
+        self._search_versions = {}
+        self._search_index_lock = threading.Lock()
+
+        # The pipeline itself keeps no per-request state; the only shared mutable
+        # state is one lock per URL so concurrent misses build a paper only once
+        self._url_locks = {}
+        self._url_locks_guard = threading.Lock()
+
+    @property
+    def embedding_model(self):
+        return registry.embedding_model(self.embedding_model_name)
+
+    @property
+    def chunker(self):
+        if self._chunker is None:
+            max_tokens = self.chunk_tokens or chunk_token_budget(self.embedding_model,
+                                                                 registry.tokenizer(self.model_name))
+            tokenizer = getattr(self.embedding_model, "tokenizer", None)
+            self._chunker = TokenChunker(tokenizer, max_tokens, min(self.chunk_overlap, max_tokens // 2))
+        return self._chunker
+
+    @property
+    def document_fingerprint(self):
+        """
+        Settings a cached Document's chunks and embeddings were built with; entries
+        cached under a different fingerprint are rebuilt.
+        """
+        return {"format": DOCUMENT_FORMAT_VERSION, "embedding_model": self.embedding_model_name,
+                "chunk_tokens": self.chunker.max_tokens, "chunk_overlap": self.chunker.overlap}
+
+    def is_fresh(self, meta):
+        """
+        Whether a cached paper can be served as is: built with the current chunking
+        and embedding settings and not yet due for revalidation.
+        """
+        return meta.get("fingerprint") == self.document_fingerprint and not self.fetcher.is_stale(meta)
 
-    def download_pdf(self, url):
-        response = requests.get(url)
-        response.raise_for_status()
-        temp_pdf = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-        temp_pdf.write(response.content)
-        temp_pdf.close()
-        return temp_pdf.name
+    def _generate(self, input_text, route):
+        profile = self.decoding[route]
+        with metrics.stage("generate"):
+            return self.generator.generate(input_text, max_length=profile.max_length, num_beams=profile.num_beams)
+
+    def _submit(self, input_text, route):
+        profile = self.decoding[route]
+        return self.generator.submit(input_text, max_length=profile.max_length, num_beams=profile.num_beams)
+
+    @metrics.timed("embed_query")
+    def embed_question(self, question):
+        return self.embedding_model.encode(question)
+
+    def _url_lock(self, url):
+        with self._url_locks_guard:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    def load_paper(self, url, on_progress=None):
+        """
+        Return the Document for `url`, using the document cache when possible so only
+        the first request for a paper pays for download, parsing and embedding. Cached
+        papers older than the fetcher's revalidation age are checked with a conditional
+        request and only rebuilt if the PDF actually changed; papers cached with other
+        chunking or embedding settings are always rebuilt. `on_progress(stage)` is
+        called with "cached", "fetched" and "parsed" as the paper moves through the stages.
+        """
+        report_progress = on_progress or (lambda stage: None)
+
+        def on_progress(stage):
+            if stage in ("cached", "fetched"):
+                DOCUMENT_LOADS.inc(result=stage)
+            report_progress(stage)
+
+        document = self.cache.get(url)
+        if document is not None and self.is_fresh(document.meta):
+            on_progress("cached")
+            return document
+
+        with self._url_lock(url):
+            # Another request may have built the paper while we waited
+            document = self.cache.get(url)
+            if document is not None and self.is_fresh(document.meta):
+                on_progress("cached")
+                return document
+            if document is not None and document.meta.get("fingerprint") != self.document_fingerprint:
+                # Its chunks are of no use, whether or not the PDF changed
+                document = None
+
+            with metrics.stage("fetch"):
+                result = self.fetcher.fetch(url)
+            pdf_path = result.path
+            if result.not_modified:
+                if document is not None:
+                    on_progress("cached")
+                    return self.cache.mark_validated(url, result.etag, result.last_modified)
+                # The PDF is still on disk but its parsed state is gone; rebuild from a copy
+                pdf_path = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf").name
+                shutil.copyfile(result.path, pdf_path)
+            elif document is not None and file_sha256(pdf_path) == document.meta.get("content_hash"):
+                os.remove(pdf_path)
+                on_progress("cached")
+                return self.cache.mark_validated(url, result.etag, result.last_modified)
+            on_progress("fetched")
+
+            try:
+                text_chunks, chunks = [], []
+
+                # Pages are chunked and embedded as they come out of the extractor
+                def stream_pages():
+                    for page in metrics.timed_iter("extract", self.extractor.iter_pages(pdf_path)):
+                        text_chunks.append(page)
+                        yield page
+
+                def stream_chunks():
+                    for chunk in self.iter_chunks(stream_pages()):
+                        chunks.append(chunk)
+                        yield chunk
+
+                with metrics.stage("ingest"):
+                    embeddings, index = self.embed_chunks(stream_chunks())
+                on_progress("parsed")
+                with metrics.stage("cache_store"):
+                    return self.cache.put(url, pdf_path, text_chunks, chunks, embeddings, index,
+                                          etag=result.etag, last_modified=result.last_modified,
+                                          fingerprint=self.document_fingerprint)
+            finally:
+                # put() moves the PDF into the cache; only clean up if something failed first
+                if os.path.exists(pdf_path):
+                    os.remove(pdf_path)
+
+    def load_papers(self, urls):
+        """
+        Load several papers concurrently, in the order of `urls`.
+        """
+        # Each task runs in a copy of the caller's context so its spans reach the request trace
+        return list(self._loader.map(lambda task: task(), [in_context(self.load_paper, url) for url in urls]))
 
     def extract_text_from_pdf(self, pdf_path):
-        text_chunks = []
-        with open(pdf_path, "rb") as file:
-            reader = PyPDF2.PdfReader(file)
-            for page_num, page in enumerate(reader.pages):
-                text = page.extract_text()
-                text_chunks.append((page_num, text))
-        return text_chunks
-
-    def chunk_text_with_context(self, text_chunks, chunk_size=512):
-        self.chunks_with_context = []
-        for page_num, text in text_chunks:
-            words = text.split()
-            for i in range(0, len(words), chunk_size):
-                chunk_text = " ".join(words[i:i + chunk_size])
-                self.chunks_with_context.append((page_num, chunk_text))
-
-    def embed_chunks(self):
-        embeddings = [self.embedding_model.encode(chunk[1]) for chunk in self.chunks_with_context]
-        dimension = len(embeddings[0])
-        self.index = faiss.IndexFlatL2(dimension)
-        self.index.add(np.array(embeddings).astype('float32'))
-
-    def retrieve_chunks_with_context(self, question, k=2):
-        question_embedding = self.embedding_model.encode(question)
-        _, indices = self.index.search(np.array([question_embedding]).astype('float32'), k)
-        return [(self.chunks_with_context[i][0], self.chunks_with_context[i][1]) for i in indices[0]]
+        return self.extractor.extract_pages(pdf_path)
+
+    def iter_chunks(self, pages, chunk_size=None):
+        """
+        Split pages into chunks of at most `chunk_size` embedding tokens (by default the
+        budget derived from the embedding and generation models), tagged with their
+        section headings. See TokenChunker.
+        """
+        chunker = self.chunker
+        if chunk_size is not None and chunk_size != chunker.max_tokens:
+            chunker = TokenChunker(chunker.tokenizer, chunk_size, min(chunker.overlap, chunk_size // 2))
+        return chunker.iter_chunks(pages)
+
+    @metrics.timed("chunk")
+    def chunk_text_with_context(self, text_chunks, chunk_size=None):
+        return list(self.iter_chunks(text_chunks, chunk_size))
+
+    def embed_chunks(self, chunks_with_context, batch_size=None):
+        """
+        Embed chunks with one batched `encode` call per `batch_size` chunks (all of them
+        at once when given a list) and build their FAISS index.
+        """
+        batch_size = batch_size or self.embed_batch_size
+        if isinstance(chunks_with_context, (list, tuple)):
+            batches = [chunks_with_context]
+        else:
+            # Streamed chunks are encoded as soon as a full batch has arrived
+            chunks = iter(chunks_with_context)
+            batches = iter(lambda: list(itertools.islice(chunks, batch_size)), [])
+
+        # Only time spent encoding counts as "embed"; the chunks may still be streaming in
+        embeddings, encode_seconds = [], 0.0
+        for batch in batches:
+            if not batch:
+                continue
+            start = time.perf_counter()
+            embeddings.append(self.embedding_model.encode([chunk.text for chunk in batch], batch_size=batch_size,
+                                                          convert_to_numpy=True))
+            encode_seconds += time.perf_counter() - start
+        metrics.observe_stage("embed", encode_seconds)
+        if not embeddings:
+            # No extractable text (e.g. a scanned PDF): an empty paper rather than an error
+            embeddings = [np.zeros((0, self.embedding_model.get_sentence_embedding_dimension()))]
+        embeddings = np.concatenate(embeddings).astype('float32')
+        index = faiss.IndexFlatL2(embeddings.shape[1])
+        index.add(embeddings)
+        return embeddings, index
+
+    @metrics.timed("retrieve")
+    def retrieve_chunks_with_context(self, document, question, k=2, question_embedding=None):
+        if question_embedding is None:
+            question_embedding = self.embed_question(question)
+        k = min(k, document.index.ntotal)
+        if k == 0:
+            return []
+        _, indices = document.index.search(np.array([question_embedding]).astype('float32'), k)
+        return [document.chunks[i] for i in indices[0] if i >= 0]
+
+    def _answer_prompt(self, question, context):
+        return f"Question: {question}\nContext: {context}\nAnswer:"
+
+    def _heading_prompt(self, context):
+        return f"Find the Heading name inside the following text:\n{context}\nHeading:"
+
+    def source_heading(self, context_chunks):
+        """
+        Heading of the best-ranked retrieved chunk that has one, or None if the
+        generator should infer it (heading_mode "llm", or "fallback" without one).
+        """
+        if self.heading_mode == "llm":
+            return None
+        return next((chunk.heading for chunk in context_chunks if chunk.heading), None)
+
+    def _needs_heading_inference(self, heading):
+        return heading is None and self.heading_mode != "metadata"
 
     def generate_answer_with_source(self, question, context_chunks):
-        context = " ".join(chunk for _, chunk in context_chunks)
-        input_text = f"Question: {question}\nContext: {context}\nAnswer:"
+        context = " ".join(chunk.text for chunk in context_chunks)
+        input_text = self._answer_prompt(question, context)
 
         # Generate answer using FLAN-T5
-        inputs = tokenizer(input_text, return_tensors="pt", truncation=True, padding=True)
-        outputs = flan_t5_model.generate(inputs["input_ids"], max_length=1024, num_beams=4, early_stopping=True)
-        answer = tokenizer.decode(outputs[0], skip_special_tokens=True)
+        answer = self._generate(input_text, "answer")
 
-        heading = self.infer_heading_for_full_context(context)
+        heading = self.source_heading(context_chunks)
+        if self._needs_heading_inference(heading):
+            heading = self.infer_heading_for_full_context(context)
 
         return {"answer": answer, "source_heading": heading}
 
     def infer_heading_for_full_context(self, context):
-        input_text = f"Find the Heading name inside the following text:\n{context}\nHeading:"
+        input_text = self._heading_prompt(context)
 
         # Generate heading using FLAN-T5
-        inputs = tokenizer(input_text, return_tensors="pt", truncation=True, padding=True)
-        outputs = flan_t5_model.generate(inputs["input_ids"], max_length=100, num_beams=4, early_stopping=True)
-        inferred_heading = tokenizer.decode(outputs[0], skip_special_tokens=True)
+        inferred_heading = self._generate(input_text, "heading")
 
         return inferred_heading
 
+    def _stored_summary(self, url):
+        # Answer from the summary store using the cached PDF hash, without loading the paper
+        meta = self.cache.get_meta(url)
+        if meta is None or self.fetcher.is_stale(meta):
+            return None
+        return self.summary_store.get(url, self.model_name, self.summarizer.cache_params(), meta.get("content_hash"))
+
+    def summarize_document(self, document):
+        params = self.summarizer.cache_params()
+        content_hash = document.meta.get("content_hash")
+        summary = self.summary_store.get(document.url, self.model_name, params, content_hash)
+        if summary is None:
+            context = " ".join(page[1] for page in document.pages)
+
+            # Map-reduce over the whole paper using FLAN-T5
+            with metrics.stage("summarize"):
+                summary = self.summarizer.summarize_text(context)
+            self.summary_store.put(document.url, self.model_name, params, content_hash, summary)
+        return summary
+
     def summarize_across_papers(self, urls):
+        urls = self.resolve_titles(urls)
+        summaries_by_url = {url: self._stored_summary(url) for url in urls}
+
+        # Only papers without a stored summary are loaded and summarized
+        missing = [url for url, summary in summaries_by_url.items() if summary is None]
+        for url, document in zip(missing, self.load_papers(missing)):
+            summaries_by_url[url] = self.summarize_document(document)
+
         summaries = []
-        urls = [self.get_url_from_title(url) for url in urls]
         for url in urls:
-            pdf_path = self.download_pdf(url)
-            try:
-                text_chunks = self.extract_text_from_pdf(pdf_path)
-                self.chunk_text_with_context(text_chunks)
-                context = " ".join(chunk[1] for chunk in self.chunks_with_context)
-                input_text = f"Summarize the following text coherently:\n{context}\nSummary:"
-
-                # Generate summary using FLAN-T5
-                inputs = tokenizer(input_text, return_tensors="pt", truncation=True, padding=True)
-                outputs = flan_t5_model.generate(inputs["input_ids"], max_length=1024, num_beams=4, early_stopping=True)
-                summary = tokenizer.decode(outputs[0], skip_special_tokens=True)
-
-                paper_name = url.split('/')[-1]  # Extract paper name from URL
-                summaries.append({
-                    "paper_name": paper_name,
-                    "summary": summary
-                })
-            finally:
-                os.remove(pdf_path)
+            paper_name = url.split('/')[-1]  # Extract paper name from URL
+            summaries.append({
+                "paper_name": paper_name,
+                "summary": summaries_by_url[url]
+            })
         return {"summaries": summaries}
 
     def generate_future_work_ideas(self, urls):
@@ -123,34 +405,299 @@ class RAGPipeline:
         input_text = f"Based on the following research, suggest ideas for future work:\n{context_text}\nIdeas:"
 
         # Generate future work ideas using FLAN-T5
-        inputs = tokenizer(input_text, return_tensors="pt", truncation=True, padding=True)
-        outputs = flan_t5_model.generate(inputs["input_ids"], max_length=512, num_beams=4, early_stopping=True)
-        ideas = tokenizer.decode(outputs[0], skip_special_tokens=True)
+        ideas = self._generate(input_text, "ideas")
 
         return {"future_work_ideas": ideas}
     
+    @metrics.timed("title_resolution")
     def get_url_from_title(self, title):
         url = db.get_url(title)
+        if url is None:
+            raise PaperNotFoundError([title])
         url = f"{url}.pdf"
         url.replace("abs", "pdf")
         return url
 
+    @metrics.timed("title_resolution")
+    def get_urls_from_titles(self, titles):
+        # Resolve every title of a multi-paper request in a single batched lookup;
+        # titles without a match give None
+        return [paper_pdf_url(url) if url is not None else None for url in db.get_urls(titles)]
+
+    def resolve_titles(self, titles):
+        """
+        PDF URLs for `titles`, raising PaperNotFoundError for any title without a match.
+        """
+        urls = self.get_urls_from_titles(titles)
+        missing = [title for title, url in zip(titles, urls) if url is None]
+        if missing:
+            raise PaperNotFoundError(missing)
+        return urls
+
     def answer_question_with_source(self, url, question, k=2):
         url = self.get_url_from_title(url)
-        pdf_path = self.download_pdf(url)
-        try:
-            text_chunks = self.extract_text_from_pdf(pdf_path)
-            self.chunk_text_with_context(text_chunks)
-            self.embed_chunks()
-            context_chunks = self.retrieve_chunks_with_context(question, k)
-            answer_data = self.generate_answer_with_source(question, context_chunks)
-            return {"answer": answer_data['answer'], "source_heading": answer_data['source_heading']}
-        finally:
-            os.remove(pdf_path)
-
-    def answer_across_papers(self, question, urls, k=2):
-        answers = []
+        return self.answer_question_from_url(url, question, k)
+
+    def _answer_cache_key(self, document, k, retrieval="dense", decoding=None):
+        # `decoding` is the profile the answer was actually generated with
+        return (document.url, document.meta.get("content_hash"), k, self.model_name, self.generator.backend,
+                decoding or self.decoding["answer"], self.heading_mode, retrieval)
+
+    def answer_question_from_url(self, url, question, k=2):
+        document = self.load_paper(url)
+        question_embedding = self.embed_question(question)
+        cache_key = self._answer_cache_key(document, k)
+        cached = self.answer_cache.get(cache_key, question_embedding)
+        if cached is not None:
+            return cached
+
+        context_chunks = self.retrieve_chunks_with_context(document, question, k, question_embedding)
+        answer_data = self.generate_answer_with_source(question, context_chunks)
+        answer_data = {"answer": answer_data['answer'], "source_heading": answer_data['source_heading']}
+        self.answer_cache.put(cache_key, question, question_embedding, answer_data)
+        return answer_data
+
+    def corpus_index(self, documents):
+        """
+        Return a CorpusIndex over `documents`, reusing one built for the same papers.
+        """
+        key = tuple((document.url, document.meta.get("content_hash")) for document in documents)
+        corpus = self._corpus_indexes.get(key)
+        if corpus is None:
+            corpus = CorpusIndex(documents, self.index_type)
+            self._corpus_indexes.put(key, corpus)
+        return corpus
+
+    def hybrid_index(self, documents):
+        """
+        Return a HybridIndex over `documents`, reusing one built for the same papers.
+        """
+        key = tuple((document.url, document.meta.get("content_hash")) for document in documents)
+        index = self._hybrid_indexes.get(key)
+        if index is None:
+            index = HybridIndex(documents)
+            self._hybrid_indexes.put(key, index)
+        return index
+
+    def search_index(self):
+        """
+        Return the HybridIndex over every cached paper built with the current chunking
+        and embedding settings. Papers cached, rebuilt or evicted since the last call
+        are added or removed one by one, reading only their own entries from disk.
+        """
+        fingerprint = self.document_fingerprint
+        with self._search_index_lock:
+            current = {meta["url"]: (meta.get("content_hash"), meta.get("cached_at"))
+                       for meta in self.cache.list_meta() if meta.get("fingerprint") == fingerprint}
+            for url, version in list(self._search_versions.items()):
+                if current.get(url) != version:
+                    self._search_index.remove(url)
+                    del self._search_versions[url]
+            for url in current.keys() - self._search_versions.keys():
+                # Read past the in-memory LRU so a first search does not evict hot papers
+                document = self.cache.get(url, remember=False)
+                if document is None:
+                    continue
+                self._search_index.add_documents([document])
+                self._search_versions[url] = (document.meta.get("content_hash"), document.meta.get("cached_at"))
+        return self._search_index
+
+    def answer_across_papers(self, question, urls, k=2, scope="per_paper", retrieval=None):
+        """
+        Answer `question` for several papers with one retrieval index and batched
+        generation: the question is encoded once, the top-k chunks are taken per paper
+        (scope="per_paper") or across all papers (scope="global"), and the answers for
+        every paper (plus any headings that need inferring) are generated together.
+        `retrieval` ("dense" or "hybrid") defaults to the pipeline's retrieval mode.
+        """
+        if scope not in ANSWER_SCOPES:
+            raise ValueError(f"Unknown answer scope {scope!r}, expected one of {ANSWER_SCOPES}")
+        retrieval = retrieval or self.retrieval
+        if retrieval not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode {retrieval!r}, expected one of {RETRIEVAL_MODES}")
+        pdf_urls = self.resolve_titles(urls)
+        # Download and parse every paper up front, in parallel
+        documents = self.load_papers(pdf_urls)
+        question_embedding = self.embed_question(question)
+
+        # Per-paper answers only depend on the paper, so they share the single-paper cache
+        cached = [None] * len(documents)
+        if scope != "global":
+            cached = [self.answer_cache.get(self._answer_cache_key(document, k, retrieval), question_embedding)
+                      for document in documents]
+        if all(answer is not None for answer in cached):
+            return [{"paper_url": url, **answer} for url, answer in zip(urls, cached)]
+
+        with metrics.stage("retrieve"):
+            if retrieval == "hybrid":
+                corpus, query = self.hybrid_index(documents), (question, question_embedding)
+            else:
+                corpus, query = self.corpus_index(documents), (question_embedding,)
+            if scope == "global":
+                chunks_per_paper = [[] for _ in documents]
+                for position, chunk, _ in corpus.search(*query, k):
+                    chunks_per_paper[position].append(chunk)
+            else:
+                chunks_per_paper = [[chunk for _, chunk, _ in hits]
+                                    for hits in corpus.search_per_paper(*query, k)]
+
+        selected = [(position, chunks) for position, chunks in enumerate(chunks_per_paper)
+                    if chunks and cached[position] is None]
+        contexts = [" ".join(chunk.text for chunk in chunks) for _, chunks in selected]
+        headings = [self.source_heading(chunks) for _, chunks in selected]
+
+        # Submit both sets before waiting so each runs as one padded generate call;
+        # headings are only generated for chunks without a parsed one
+        answer_futures = [self._submit(self._answer_prompt(question, context), "answer") for context in contexts]
+        heading_futures = [self._submit(self._heading_prompt(context), "heading")
+                           if self._needs_heading_inference(heading) else None
+                           for context, heading in zip(contexts, headings)]
+
+        with metrics.stage("generate"):
+            for (position, _), answer, heading, future in zip(selected, answer_futures, headings, heading_futures):
+                if future is not None:
+                    heading = future.result()
+                cached[position] = {"answer": answer.result(), "source_heading": heading}
+                if scope != "global":
+                    self.answer_cache.put(self._answer_cache_key(documents[position], k, retrieval), question,
+                                          question_embedding, cached[position])
+        return [{"paper_url": url, **answer} for url, answer in zip(urls, cached) if answer is not None]
+
+    def search_chunks(self, question, titles=None, k=10, year_from=None, year_to=None):
+        """
+        Rank chunks of every cached paper, or only of the papers named in `titles`, by
+        hybrid (BM25 prefilter + dense) relevance to `question`. `year_from`/`year_to`
+        keep papers whose database year lies in the range; papers unknown to the
+        database are then left out. Returns hit dicts, best first.
+        """
+        if titles:
+            # Named papers are loaded (and cached) first, so the index below covers them
+            pdf_urls = [url for url in self.get_urls_from_titles(titles) if url is not None]
+            self.load_papers(pdf_urls)
+
+        with metrics.stage("hybrid_index"):
+            corpus = self.search_index()
+        # Positions of the papers indexed right now; concurrent searches may add more
+        positions = dict(corpus.positions)
+        if not positions:
+            return []
+        papers = None
+        if titles:
+            papers = {positions[url] for url in pdf_urls if url in positions}
+
+        metadata = {}
+        year_from, year_to = parse_year(year_from), parse_year(year_to)
+        if year_from is not None or year_to is not None:
+            metadata = db.get_paper_metadata([paper_url(url) for url in positions])
+            in_range = {position for url, position in positions.items()
+                        if (meta := metadata.get(paper_url(url))) is not None and meta["year"] is not None
+                        and (year_from is None or meta["year"] >= year_from)
+                        and (year_to is None or meta["year"] <= year_to)}
+            papers = in_range if papers is None else papers & in_range
+
+        question_embedding = self.embed_question(question)
+        with metrics.stage("retrieve"):
+            hits = corpus.search(question, question_embedding, k, papers)
+
+        hit_urls = [paper_url(corpus.urls[position]) for position, _, _ in hits]
+        missing = [url for url in hit_urls if url not in metadata]
+        if missing:
+            metadata.update(db.get_paper_metadata(set(missing)))
+        return [
+            {"paper_url": url, "title": metadata.get(url, {}).get("title"), "year": metadata.get(url, {}).get("year"),
+             "page": chunk.page, "heading": chunk.heading, "text": chunk.text, "score": score}
+            for url, (_, chunk, score) in zip(hit_urls, hits)
+        ]
+
+    # Streaming variants: each yields event dicts ({"event": "progress" | "token" |
+    # "summary" | "done", ...}) that the API turns into server-sent events
+
+    def _with_progress(self, func, *args, **progress_info):
+        """
+        Run `func(*args, on_progress=...)` on a helper thread, yielding its progress
+        events as they happen; the generator's return value is func's result.
+        """
+        events = queue.Queue()
+        outcome = {}
+
+        def run():
+            try:
+                outcome["result"] = func(*args, on_progress=lambda stage: events.put(stage))
+            except BaseException as exc:
+                outcome["error"] = exc
+            finally:
+                events.put(None)
+
+        threading.Thread(target=run, daemon=True).start()
+        while (stage := events.get()) is not None:
+            yield {"event": "progress", "stage": stage, **progress_info}
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["result"]
+
+    def _stream_tokens(self, input_text, max_length):
+        # Yields token events and returns the full text
+        pieces = []
+        start = time.perf_counter()
+        for piece in self.generator.stream(input_text, max_length=max_length):
+            pieces.append(piece)
+            yield {"event": "token", "text": piece}
+        metrics.observe_stage("generate_stream", time.perf_counter() - start)
+        return "".join(pieces)
+
+    def stream_answer(self, title, question, k=2):
+        url = self.get_url_from_title(title)
+        yield {"event": "progress", "stage": "resolved", "paper_url": url}
+        document = yield from self._with_progress(self.load_paper, url, paper_url=url)
+        question_embedding = self.embed_question(question)
+        # Streamed answers are decoded greedily, so they are cached apart from beam-search ones
+        cache_key = self._answer_cache_key(document, k, decoding=replace(self.decoding["answer"], num_beams=1))
+        cached = self.answer_cache.get(cache_key, question_embedding)
+        if cached is not None:
+            yield {"event": "progress", "stage": "answer_cached"}
+            yield {"event": "done", **cached}
+            return
+
+        context_chunks = self.retrieve_chunks_with_context(document, question, k, question_embedding)
+        yield {"event": "progress", "stage": "retrieved", "chunks": len(context_chunks)}
+
+        context = " ".join(chunk.text for chunk in context_chunks)
+        answer = yield from self._stream_tokens(self._answer_prompt(question, context),
+                                                max_length=self.decoding["answer"].max_length)
+        heading = self.source_heading(context_chunks)
+        if self._needs_heading_inference(heading):
+            heading = self.infer_heading_for_full_context(context)
+        answer_data = {"answer": answer, "source_heading": heading}
+        self.answer_cache.put(cache_key, question, question_embedding, answer_data)
+        yield {"event": "done", **answer_data}
+
+    def stream_summaries(self, titles):
+        """
+        Yield each paper's summary as soon as it is ready, in request order; stored
+        summaries are sent without loading their paper.
+        """
+        urls = self.resolve_titles(titles)
+        yield {"event": "progress", "stage": "resolved", "papers": len(urls)}
+        summaries = []
         for url in urls:
-            answer_data = self.answer_question_with_source(url, question, k)
-            answers.append({"paper_url": url, "answer": answer_data['answer'], "source_heading": answer_data['source_heading']})
-        return answers
+            paper_name = url.split('/')[-1]
+            summary = self._stored_summary(url)
+            if summary is None:
+                document = yield from self._with_progress(self.load_paper, url, paper_url=url)
+                yield {"event": "progress", "stage": "summarizing", "paper_url": url}
+                summary = self.summarize_document(document)
+            summaries.append({"paper_name": paper_name, "summary": summary})
+            yield {"event": "summary", "paper_name": paper_name, "summary": summary}
+        yield {"event": "done", "summaries": summaries}
+
+    def stream_future_work_ideas(self, titles):
+        summaries = []
+        for event in self.stream_summaries(titles):
+            if event["event"] == "done":
+                summaries = event["summaries"]
+            else:
+                yield event
+        context_text = "\n".join([f"Paper: {summary['paper_name']}\nSummary: {summary['summary']}" for summary in summaries])
+        input_text = f"Based on the following research, suggest ideas for future work:\n{context_text}\nIdeas:"
+        ideas = yield from self._stream_tokens(input_text, max_length=self.decoding["ideas"].max_length)
+        yield {"event": "done", "future_work_ideas": ideas}
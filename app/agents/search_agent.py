@@ -1,7 +1,7 @@
 # app/agents/search_agent.py
-from db.db_init import Neo4jDatabase
+from db.db_init import get_database
 
-db = Neo4jDatabase("bolt://localhost:7687", "neo4j", "Ashu@13016")
+db = get_database()
 
 def add_paper(title, year, topic, url):
     db.create_paper(title, year, topic, url)
@@ -0,0 +1,107 @@
+# app/agents/summarization.py
+import os
+from dataclasses import asdict, dataclass
+
+from app.model_registry import registry
+
+SUMMARY_MODES = ("map_reduce", "truncate")
+
+
+@dataclass(frozen=True)
+class SummarizationSettings:
+    # "map_reduce" covers the whole paper; "truncate" is the old single prompt that
+    # only sees the first context window of the paper
+    mode: str = os.environ.get("SUMMARY_MODE", "map_reduce")
+    batch_size: int = int(os.environ.get("SUMMARY_BATCH_SIZE", 8))
+    num_beams: int = int(os.environ.get("SUMMARY_NUM_BEAMS", 2))
+    map_max_length: int = int(os.environ.get("SUMMARY_MAP_MAX_LENGTH", 128))
+    reduce_max_length: int = int(os.environ.get("SUMMARY_REDUCE_MAX_LENGTH", 256))
+    # Input tokens the generator can attend to (512 for FLAN-T5)
+    context_tokens: int = int(os.environ.get("SUMMARY_CONTEXT_TOKENS", 512))
+
+    def __post_init__(self):
+        if self.mode not in SUMMARY_MODES:
+            raise ValueError(f"Unknown summary mode {self.mode!r}, expected one of {SUMMARY_MODES}")
+
+
+MAP_PROMPT = "Summarize the following text coherently:\n{text}\nSummary:"
+REDUCE_PROMPT = "Combine the following partial summaries into one coherent summary:\n{text}\nSummary:"
+
+
+class MapReduceSummarizer:
+    """
+    Summarizes a whole document without exceeding the generator's context window.
+
+    The map step splits the document text into windows that fit the context and
+    summarizes them in padded batches of `batch_size` prompts. The reduce step packs
+    the partial summaries into groups that fit the context and summarizes each group,
+    repeating until a single summary is left.
+    """
+
+    def __init__(self, generator, model_name, settings=None):
+        self.generator = generator
+        self.model_name = model_name
+        self.settings = settings or SummarizationSettings()
+
+    def cache_params(self):
+        # Everything that changes the generated text; batch size only affects speed
+        params = asdict(self.settings)
+        params.pop("batch_size")
+        # Quantized and ONNX models can word summaries slightly differently
+        if self.generator.backend != "torch":
+            params["backend"] = self.generator.backend
+        return params
+
+    @property
+    def tokenizer(self):
+        return registry.generator(self.model_name, self.generator.backend)[0]
+
+    def _budget(self, prompt):
+        overhead = len(self.tokenizer(prompt.format(text=""))["input_ids"])
+        return max(self.settings.context_tokens - overhead, 32)
+
+    def _token_windows(self, text, budget):
+        ids = self.tokenizer(text, add_special_tokens=False)["input_ids"]
+        return [self.tokenizer.decode(ids[i:i + budget], skip_special_tokens=True) for i in range(0, len(ids), budget)]
+
+    def _generate_batched(self, prompt, texts, max_length):
+        outputs = []
+        for i in range(0, len(texts), self.settings.batch_size):
+            batch = [prompt.format(text=text) for text in texts[i:i + self.settings.batch_size]]
+            outputs.extend(self.generator.generate_batch(batch, max_length=max_length,
+                                                         num_beams=self.settings.num_beams))
+        return outputs
+
+    def summarize_text(self, text):
+        if self.settings.mode == "truncate":
+            return self.generator.generate(MAP_PROMPT.format(text=text), max_length=self.settings.reduce_max_length,
+                                           num_beams=self.settings.num_beams)
+
+        windows = self._token_windows(text, self._budget(MAP_PROMPT))
+        if not windows:
+            return ""
+        summaries = self._generate_batched(MAP_PROMPT, windows, self.settings.map_max_length)
+        return self.reduce(summaries)
+
+    def reduce(self, summaries):
+        budget = self._budget(REDUCE_PROMPT)
+        while len(summaries) > 1:
+            groups = self._pack(summaries, budget)
+            summaries = self._generate_batched(REDUCE_PROMPT, groups, self.settings.reduce_max_length)
+        return summaries[0]
+
+    def _pack(self, summaries, budget):
+        # Cap every piece at half the budget so each group holds at least two of them
+        # and the number of summaries shrinks on every round
+        piece_budget = budget // 2
+        groups, current, used = [], [], 0
+        for summary in summaries:
+            ids = self.tokenizer(summary, add_special_tokens=False)["input_ids"][:piece_budget]
+            if current and used + len(ids) > budget:
+                groups.append(" ".join(current))
+                current, used = [], 0
+            current.append(self.tokenizer.decode(ids, skip_special_tokens=True))
+            used += len(ids)
+        if current:
+            groups.append(" ".join(current))
+        return groups
@@ -0,0 +1,99 @@
+# app/agents/summary_store.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from app.agents.doc_cache import DEFAULT_CACHE_DIR
+from app.agents.lru import LRUCache
+
+SUMMARY_STORE_PATH = os.environ.get("SUMMARY_STORE_PATH", os.path.join(DEFAULT_CACHE_DIR, "summaries.sqlite3"))
+SUMMARY_TTL = float(os.environ.get("SUMMARY_TTL", 7 * 24 * 3600))
+SUMMARY_MEMORY_ITEMS = int(os.environ.get("SUMMARY_MEMORY_ITEMS", 1024))
+
+
+def summary_key(paper_id, model_name, params):
+    payload = json.dumps([paper_id, model_name, params], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SummaryStore:
+    """
+    Memoized paper summaries keyed by (paper, model name, generation parameters).
+
+    An in-memory LRU sits in front of a SQLite file. Every entry records the content
+    hash of the PDF it was generated from; a lookup with a different hash (the paper
+    changed) or an entry older than `ttl` seconds is treated as a miss and deleted.
+    """
+
+    def __init__(self, path=SUMMARY_STORE_PATH, ttl=SUMMARY_TTL, max_memory_items=SUMMARY_MEMORY_ITEMS):
+        self.ttl = ttl
+        self.memory = LRUCache(max_items=max_memory_items)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS summaries ("
+                "key TEXT PRIMARY KEY, paper_id TEXT NOT NULL, model_name TEXT NOT NULL, params TEXT NOT NULL, "
+                "content_hash TEXT, summary TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS summaries_paper_id ON summaries (paper_id)")
+
+    def get(self, paper_id, model_name, params, content_hash):
+        key = summary_key(paper_id, model_name, params)
+        entry = self.memory.get(key)
+        if entry is None:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT content_hash, summary, created_at FROM summaries WHERE key = ?", (key,)
+                ).fetchone()
+            if row is not None:
+                entry = row
+                self.memory.put(key, entry)
+
+        if entry is not None:
+            stored_hash, summary, created_at = entry
+            if stored_hash == content_hash and time.time() - created_at < self.ttl:
+                self.hits += 1
+                return summary
+            self._delete(key)
+
+        self.misses += 1
+        return None
+
+    def put(self, paper_id, model_name, params, content_hash, summary):
+        key = summary_key(paper_id, model_name, params)
+        entry = (content_hash, summary, time.time())
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, paper_id, model_name, params, content_hash, summary, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, paper_id, model_name, json.dumps(params, sort_keys=True), *entry),
+            )
+        self.memory.put(key, entry)
+
+    def _delete(self, key):
+        self.memory.pop(key)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM summaries WHERE key = ?", (key,))
+
+    def invalidate(self, paper_id):
+        with self._lock, self._conn:
+            keys = [row[0] for row in self._conn.execute("SELECT key FROM summaries WHERE paper_id = ?", (paper_id,))]
+            self._conn.execute("DELETE FROM summaries WHERE paper_id = ?", (paper_id,))
+        for key in keys:
+            self.memory.pop(key)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                "memory_items": len(self.memory)}
@@ -1,13 +1,163 @@
 # app/main.py
 from app.agents import db_agent, qa_agent
 
-from fastapi import FastAPI
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List
-from app.agents.qa_agent import RAGPipeline
+from app.agents.ingest_queue import IngestQueue, PRIORITY_INTERACTIVE, PRIORITY_PREFETCH
+from app.agents.qa_agent import PaperNotFoundError, RAGPipeline, paper_pdf_url
+from app.agents.generation import QueueFullError
+from app.metrics import metrics, in_context, server_timing
+from app.model_registry import registry
+
+# Blocking pipeline stages (downloads, PDF parsing, Neo4j, generation) run on this
+# bounded pool so the event loop stays free to accept other requests
+PIPELINE_WORKERS = int(os.environ.get("PIPELINE_WORKERS", 8))
+MAX_PENDING_REQUESTS = int(os.environ.get("MAX_PENDING_REQUESTS", 64))
+# The first INGEST_PREFETCH_LIMIT papers of every /get_papers/ result are loaded in the background
+INGEST_PREFETCH_LIMIT = int(os.environ.get("INGEST_PREFETCH_LIMIT", 10))
+# Prefetch stops after the embeddings by default: summaries share the generation queue
+# with interactive answers and would slow down the follow-up questions prefetch is for
+INGEST_PREFETCH_SUMMARIES = os.environ.get("INGEST_PREFETCH_SUMMARIES", "0") == "1"
 
 app = FastAPI()
 qa_agent = RAGPipeline()
+ingest_queue = IngestQueue(qa_agent)
+executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="pipeline")
+pending_requests = 0
+
+# Models load lazily on first use; set PRELOAD_MODELS=1 to pay that cost at startup instead
+@app.on_event("startup")
+def preload_models():
+    if os.environ.get("PRELOAD_MODELS") == "1":
+        registry.embedding_model(qa_agent.embedding_model_name)
+        registry.generator(qa_agent.model_name, qa_agent.generator.backend)
+
+@app.on_event("shutdown")
+def shutdown_executor():
+    ingest_queue.shutdown()
+    executor.shutdown(wait=False)
+
+# Request latency per route and, with METRICS_TRACING=1, a Server-Timing header
+# listing the pipeline stages the request went through
+request_seconds = metrics.histogram("research_agent_request_seconds", "Latency of API requests until the response starts",
+                                    labels=("route",))
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    if not metrics.enabled:
+        return await call_next(request)
+    spans = metrics.start_trace()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    request_seconds.observe(elapsed, route=route.path if route is not None else "unmatched")
+    if spans is not None:
+        response.headers["Server-Timing"] = server_timing(spans + [("total", elapsed)])
+    return response
+
+def generation_counters():
+    stats = qa_agent.generator.stats()
+    return {(name,): stats[name] for name in ("batches", "requests", "rejected", "input_tokens", "output_tokens")}
+
+def cache_counters(outcome):
+    caches = {"summaries": qa_agent.summary_store, "answers": qa_agent.answer_cache}
+    return {(name,): getattr(cache, outcome) for name, cache in caches.items()}
+
+metrics.gauge_callback("research_agent_pending_requests", "Requests queued or running on the pipeline executor",
+                       lambda: pending_requests)
+metrics.gauge_callback("research_agent_generation_queue_depth", "Prompts waiting for the generation worker",
+                       lambda: qa_agent.generator.stats()["queue_depth"])
+metrics.gauge_callback("research_agent_ingest_queue_depth", "Papers waiting for background ingestion",
+                       lambda: ingest_queue.stats()["queued"])
+metrics.counter_callback("research_agent_generation_total", "Generation batches, requests, rejections and tokens",
+                         generation_counters, labels=("counter",))
+metrics.counter_callback("research_agent_cache_hits_total", "Cache hits", lambda: cache_counters("hits"),
+                         labels=("cache",))
+metrics.counter_callback("research_agent_cache_misses_total", "Cache misses", lambda: cache_counters("misses"),
+                         labels=("cache",))
+
+@app.exception_handler(QueueFullError)
+async def queue_full_handler(request: Request, exc: QueueFullError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+@app.exception_handler(PaperNotFoundError)
+async def paper_not_found_handler(request: Request, exc: PaperNotFoundError):
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+async def run_blocking(func, *args):
+    """
+    Run `func` on the pipeline executor, rejecting the request with 503 once
+    MAX_PENDING_REQUESTS calls are already queued or running.
+    """
+    global pending_requests
+    if pending_requests >= MAX_PENDING_REQUESTS:
+        raise HTTPException(status_code=503, detail="Server is busy, try again shortly",
+                            headers={"Retry-After": "1"})
+    pending_requests += 1
+    try:
+        # Run in a copy of the request context so pipeline stages land in its trace
+        return await asyncio.get_running_loop().run_in_executor(executor, in_context(func, *args))
+    finally:
+        pending_requests -= 1
+
+class EventStreamResponse(StreamingResponse):
+    """
+    StreamingResponse that calls `on_close` once the response is over, including
+    when the client disconnects before the body iterator has started.
+    """
+
+    def __init__(self, content, on_close, **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.on_close()
+
+def event_stream(events):
+    """
+    Wrap a pipeline event generator as a server-sent events response. Starlette runs
+    the synchronous generator on its thread pool, so the event loop is not blocked.
+    """
+    global pending_requests
+    if pending_requests >= MAX_PENDING_REQUESTS:
+        raise HTTPException(status_code=503, detail="Server is busy, try again shortly",
+                            headers={"Retry-After": "1"})
+    # A stream occupies a worker thread until it ends, so it counts as pending until then
+    pending_requests += 1
+    loop = asyncio.get_running_loop()
+    released = False
+
+    def release():
+        # Runs on the loop, from whichever of the response and the generator finishes first
+        global pending_requests
+        nonlocal released
+        if not released:
+            released = True
+            pending_requests -= 1
+
+    def encode():
+        try:
+            for event in events:
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+        except Exception as exc:
+            yield f"event: error\ndata: {json.dumps({'event': 'error', 'detail': str(exc)})}\n\n"
+        finally:
+            # The generator runs on Starlette's thread pool; update the counter on the loop
+            loop.call_soon_threadsafe(release)
+
+    return EventStreamResponse(encode(), release, media_type="text/event-stream",
+                               headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # Define a model to validate request bodies for multi-paper requests
 class PapersRequest(BaseModel):
@@ -16,44 +166,125 @@ class PapersRequest(BaseModel):
 # Route to fetch papers based on topic and year range
 @app.get("/get_papers/")
 async def get_papers(topic: str = None, year_from: int = None, year_to: int = None):
-    papers = db_agent.get_papers(topic, year_from, year_to)
+    papers = await run_blocking(db_agent.get_papers, topic, year_from, year_to)
+    # Users usually ask about search results next, so start loading them now
+    if papers and INGEST_PREFETCH_LIMIT:
+        ingest_queue.enqueue([paper_pdf_url(url) for _, _, url in papers[:INGEST_PREFETCH_LIMIT]],
+                             priority=PRIORITY_PREFETCH, summarize=INGEST_PREFETCH_SUMMARIES, best_effort=True)
     return {"papers": papers}
 
+# Queue papers for background download, parsing, embedding and summarization
+@app.post("/ingest/")
+async def ingest_papers(request: PapersRequest, summarize: bool = None):
+    urls = await run_blocking(qa_agent.resolve_titles, request.papers)
+    jobs = ingest_queue.enqueue(urls, priority=PRIORITY_INTERACTIVE, summarize=summarize)
+    return {"jobs": [job.to_dict() for job in jobs]}
+
+# Route to check one ingest job, or the whole queue when no job_id is given
+@app.get("/ingest_status/")
+async def ingest_status(job_id: str = None):
+    if job_id is None:
+        return ingest_queue.stats()
+    job = ingest_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown ingest job {job_id}")
+    return job
+
+# Start (or resume) harvesting every arXiv result for a topic in the background
+@app.post("/harvest/")
+async def harvest_topic(topic: str, max_results: int = None, restart: bool = False):
+    return await run_blocking(db_agent.harvester.start_background, topic, max_results, restart)
+
+# Route to check the progress of a background harvest
+@app.get("/harvest_status/")
+async def harvest_status(topic: str):
+    return await run_blocking(db_agent.harvester.status, topic)
+
+# Route to stop a background harvest after the current page; it can be resumed later
+@app.post("/harvest_stop/")
+async def harvest_stop(topic: str):
+    return await run_blocking(db_agent.harvester.stop, topic)
+
 # Route to answer a question based on a single paper
 @app.get("/answer_question_single/")
 async def answer_question(question: str, paper: str):
-    answer_data = qa_agent.answer_question_with_source(paper, question)
+    answer_data = await run_blocking(qa_agent.answer_question_with_source, paper, question)
     return {"answer": answer_data['answer'], "source_heading": answer_data['source_heading']}
 
+# Streaming variant: progress events, then answer tokens as they are generated
+@app.get("/answer_question_single_stream/")
+async def answer_question_stream(question: str, paper: str):
+    return event_stream(qa_agent.stream_answer(paper, question))
+
 # Route to answer a question across multiple papers
 @app.post("/answer_question_multi/")
-async def answer_question_multi(request: PapersRequest, question: str):
+async def answer_question_multi(request: PapersRequest, question: str, k: int = 2, scope: str = "per_paper",
+                                retrieval: str = None):
     papers = request.papers
-    answer = qa_agent.answer_across_papers(question, papers)
+    answer = await run_blocking(qa_agent.answer_across_papers, question, papers, k, scope, retrieval)
     return {"answer": answer}
 
+# Route to rank passages of all cached papers (or the listed ones) for a question,
+# optionally restricted to a publication year range
+@app.post("/search_chunks/")
+async def search_chunks(question: str, k: int = 10, year_from: int = None, year_to: int = None,
+                        request: PapersRequest = None):
+    papers = request.papers if request is not None else None
+    hits = await run_blocking(qa_agent.search_chunks, question, papers, k, year_from, year_to)
+    return {"results": hits}
+
 # Route to summarize a single paper
 @app.get("/summarize_paper_single/")
 async def summarize_paper(paper: str):
-    summary_data = qa_agent.summarize_across_papers([paper])
+    summary_data = await run_blocking(qa_agent.summarize_across_papers, [paper])
     return {"summaries": summary_data['summaries']}
 
 # Route to summarize multiple papers
 @app.post("/summarize_papers_multi/")
 async def summarize_papers(request: PapersRequest):
     papers = request.papers
-    summary_data = qa_agent.summarize_across_papers(papers)
+    summary_data = await run_blocking(qa_agent.summarize_across_papers, papers)
     return {"summaries": summary_data['summaries']}
 
+# Streaming variant: progress events and each paper's summary as soon as it is ready
+@app.post("/summarize_papers_multi_stream/")
+async def summarize_papers_stream(request: PapersRequest):
+    return event_stream(qa_agent.stream_summaries(request.papers))
+
 # Route to generate future work ideas based on a single paper
 @app.get("/generate_future_work_single/")
 async def generate_future_work(paper: str):
-    future_work_ideas = qa_agent.generate_future_work_ideas([paper])
+    future_work_ideas = await run_blocking(qa_agent.generate_future_work_ideas, [paper])
     return {"future_work_ideas": future_work_ideas['future_work_ideas']}
 
 # Route to generate future work ideas based on multiple papers
 @app.post("/generate_future_work_multi/")
 async def generate_future_work_multi(request: PapersRequest):
     papers = request.papers
-    future_work_ideas = qa_agent.generate_future_work_ideas(papers)
-    return {"future_work_ideas": future_work_ideas['future_work_ideas']}
\ No newline at end of file
+    future_work_ideas = await run_blocking(qa_agent.generate_future_work_ideas, papers)
+    return {"future_work_ideas": future_work_ideas['future_work_ideas']}
+
+# Streaming variant: summary progress, then idea tokens as they are generated
+@app.post("/generate_future_work_multi_stream/")
+async def generate_future_work_multi_stream(request: PapersRequest):
+    return event_stream(qa_agent.stream_future_work_ideas(request.papers))
+
+# Route to inspect inference queue depth and batching behaviour
+@app.get("/inference_stats/")
+async def inference_stats():
+    return {
+        "pending_requests": pending_requests,
+        "max_pending_requests": MAX_PENDING_REQUESTS,
+        "pipeline_workers": PIPELINE_WORKERS,
+        "generation": qa_agent.generator.stats(),
+    }
+
+# Prometheus scrape endpoint: stage latency histograms, cache hit counters, token counts and queue depth
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# Route to inspect hit rates of the pipeline caches
+@app.get("/cache_stats/")
+async def cache_stats():
+    return {"summaries": qa_agent.summary_store.stats(), "answers": qa_agent.answer_cache.stats()}
@@ -0,0 +1,275 @@
+# app/metrics.py
+import contextvars
+import functools
+import math
+import os
+import threading
+import time
+
+# Stage timings are recorded unless METRICS_ENABLED=0; per-request spans (returned in
+# a Server-Timing header) are only collected with METRICS_TRACING=1
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+METRICS_TRACING = os.environ.get("METRICS_TRACING", "0") == "1"
+
+# Seconds; pipeline stages range from sub-millisecond lookups to minute-long summaries
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_spans = contextvars.ContextVar("metrics_spans", default=None)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [bucket counts..., sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[position] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, state):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(names, key + (_format_value(bound),))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(state[-2])}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {state[-1]}")
+        return lines
+
+
+class CallbackMetric:
+    """
+    A gauge or counter whose value is read from `callback` at scrape time. The callback
+    returns a number, or a dict mapping label-value tuples to numbers.
+    """
+
+    def __init__(self, name, help, callback, kind="gauge", labels=()):
+        self.name = name
+        self.help = help
+        self.callback = callback
+        self.kind = kind
+        self.labels = tuple(labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe_stage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """
+    Process-wide metrics in Prometheus text format.
+
+    Pipeline and database code wraps its stages in `stage(name)` (or the `timed(name)`
+    decorator), which feeds the `research_agent_stage_seconds` histogram, any
+    listeners added with `add_listener(callback)` and, when tracing is on, the spans
+    of the current request. When disabled a stage is a shared no-op context manager.
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED, tracing=METRICS_TRACING):
+        self.enabled = enabled
+        self.tracing = tracing
+        self._metrics = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self.stage_seconds = self.histogram("research_agent_stage_seconds",
+                                            "Latency of pipeline and database stages", labels=("stage",))
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def gauge_callback(self, name, help, callback, labels=()):
+        return self._register(CallbackMetric(name, help, callback, "gauge", labels))
+
+    def counter_callback(self, name, help, callback, labels=()):
+        return self._register(CallbackMetric(name, help, callback, "counter", labels))
+
+    def add_listener(self, callback):
+        """
+        Call `callback(stage, seconds)` for every recorded stage, e.g. to forward
+        timings to another tracing system.
+        """
+        self._listeners.append(callback)
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def timed(self, name):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Stage(self, name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def timed_iter(self, name, iterable):
+        """
+        Yield from `iterable`, recording the total time spent producing its items
+        (not the time the consumer spends between items) as one `name` stage.
+        """
+        if not self.enabled:
+            return iterable
+        return self._timed_iter(name, iterable)
+
+    def _timed_iter(self, name, iterable):
+        iterator = iter(iterable)
+        seconds = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    seconds += time.perf_counter() - start
+                    return
+                seconds += time.perf_counter() - start
+                yield item
+        finally:
+            self.observe_stage(name, seconds)
+
+    def observe_stage(self, name, seconds):
+        if not self.enabled:
+            return
+        self.stage_seconds.observe(seconds, stage=name)
+        spans = _spans.get()
+        if spans is not None:
+            spans.append((name, seconds))
+        for listener in self._listeners:
+            listener(name, seconds)
+
+    def start_trace(self):
+        """
+        Collect the spans recorded in this context (and in contexts copied from it)
+        into the returned list. Returns None when tracing is off.
+        """
+        if not (self.enabled and self.tracing):
+            return None
+        spans = []
+        _spans.set(spans)
+        return spans
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def server_timing(spans):
+    """
+    Server-Timing header value for a request's spans; repeated stages are summed.
+    """
+    totals = {}
+    for name, seconds in spans:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f"{name.replace('.', '-')};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
+
+
+def in_context(func, *args):
+    """
+    Bind `func(*args)` to a copy of the current context, so work handed to another
+    thread still records its spans on the request that started it.
+    """
+    return functools.partial(contextvars.copy_context().run, func, *args)
+
+
+metrics = Metrics()
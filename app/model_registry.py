@@ -0,0 +1,126 @@
+# app/model_registry.py
+import os
+import threading
+
+DEFAULT_EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+DEFAULT_GENERATION_MODEL = os.environ.get("GENERATION_MODEL", "google/flan-t5-base")
+# "torch" (eager), "int8" (dynamically quantized linear layers, CPU) or "onnx" (ONNX
+# Runtime through optimum, with KV-cache reuse in the decoder)
+GENERATION_BACKEND = os.environ.get("GENERATION_BACKEND", "torch")
+GENERATION_BACKENDS = ("torch", "int8", "onnx")
+# Exported ONNX models are kept here so the export only runs once per model
+ONNX_MODEL_DIR = os.environ.get("ONNX_MODEL_DIR", "onnx_models")
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded models.
+
+    Every model is loaded once, on first use, and then shared by the database layer,
+    the RAG pipeline and the API. Generation models are cached per backend.
+    `device` and `dtype` default to the `MODEL_DEVICE` and `MODEL_DTYPE` environment
+    variables (falling back to CUDA when available and float32).
+    """
+
+    def __init__(self, device=None, dtype=None):
+        self._device = device or os.environ.get("MODEL_DEVICE")
+        self.dtype = dtype or os.environ.get("MODEL_DTYPE", "float32")
+        self._models = {}
+        self._lock = threading.Lock()
+
+    @property
+    def device(self):
+        if self._device is None:
+            import torch
+            self._device = "cuda" if torch.cuda.is_available() else "cpu"
+        return self._device
+
+    def _torch_dtype(self):
+        import torch
+        return getattr(torch, self.dtype)
+
+    def _get(self, key, loader):
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        with self._lock:
+            # Another thread may have finished loading while we waited for the lock
+            if key not in self._models:
+                self._models[key] = loader()
+            return self._models[key]
+
+    def embedding_model(self, name=DEFAULT_EMBEDDING_MODEL):
+        def load():
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(name, device=self.device)
+            if self.dtype != "float32":
+                model = model.to(self._torch_dtype())
+            return model
+
+        return self._get(("embedding", name), load)
+
+    def tokenizer(self, name=DEFAULT_GENERATION_MODEL):
+        """
+        Returns just the tokenizer of a generation model, e.g. to size prompts without
+        loading the model weights.
+        """
+        def load():
+            from transformers import AutoTokenizer
+            return AutoTokenizer.from_pretrained(name)
+
+        return self._get(("tokenizer", name), load)
+
+    def generator(self, name=DEFAULT_GENERATION_MODEL, backend=GENERATION_BACKEND):
+        """
+        Returns the (tokenizer, model) pair for a seq2seq generation model on the given
+        backend. Every backend's model supports `generate()`, including streamers.
+        """
+        if backend not in GENERATION_BACKENDS:
+            raise ValueError(f"Unknown generation backend {backend!r}, expected one of {GENERATION_BACKENDS}")
+        loaders = {"torch": self._load_torch, "int8": self._load_int8, "onnx": self._load_onnx}
+        return self._get(("generator", name, backend), lambda: loaders[backend](name))
+
+    def _load_torch(self, name):
+        from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(name)
+        model = AutoModelForSeq2SeqLM.from_pretrained(name, torch_dtype=self._torch_dtype())
+        model.to(self.device)
+        model.eval()
+        return tokenizer, model
+
+    def _load_int8(self, name):
+        # Dynamic quantization only has CPU kernels, so this backend ignores MODEL_DEVICE
+        import torch
+        from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(name)
+        model = AutoModelForSeq2SeqLM.from_pretrained(name, torch_dtype=torch.float32)
+        model.eval()
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return tokenizer, model
+
+    def _load_onnx(self, name):
+        try:
+            from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        except ImportError as exc:
+            raise ImportError("The onnx generation backend needs optimum with ONNX Runtime: "
+                              "pip install \"optimum-onnx[onnxruntime]\"") from exc
+        from transformers import AutoTokenizer
+
+        export_dir = os.path.join(ONNX_MODEL_DIR, name.replace("/", "--"))
+        if os.path.isdir(export_dir):
+            model = ORTModelForSeq2SeqLM.from_pretrained(export_dir, use_cache=True)
+            tokenizer = AutoTokenizer.from_pretrained(export_dir)
+        else:
+            # use_cache exports a decoder that takes past key/values, so each step only
+            # runs the newest token instead of the whole prefix
+            model = ORTModelForSeq2SeqLM.from_pretrained(name, export=True, use_cache=True)
+            tokenizer = AutoTokenizer.from_pretrained(name)
+            model.save_pretrained(export_dir)
+            tokenizer.save_pretrained(export_dir)
+        return tokenizer, model
+
+    def loaded_models(self):
+        return [":".join(key) for key in self._models]
+
+
+registry = ModelRegistry()
@@ -0,0 +1,115 @@
+# benchmarks/extraction_benchmark.py
+"""
+Compare PDF extraction throughput (pages/sec) of the PyMuPDF and PyPDF2 backends.
+
+Run from the repository root:
+
+    python -m benchmarks.extraction_benchmark [PDF or directory ...] [--repeat N] [--json out.json]
+
+Without arguments the sample PDFs in benchmarks/samples/ are used; they are
+generated with PyMuPDF on first run so no binaries need to live in the repository.
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+from app.agents.extraction import BACKENDS, PDFExtractor, _import_pymupdf
+
+SAMPLES_DIR = os.path.join(os.path.dirname(__file__), "samples")
+SAMPLE_SPECS = [("short", 8), ("medium", 32), ("long", 120)]
+
+PARAGRAPH = (
+    "We study retrieval augmented generation for scientific question answering. "
+    "Our method combines dense passage retrieval with a sequence to sequence reader "
+    "and improves exact match on three benchmarks while reducing latency. "
+)
+
+
+def generate_samples(directory=SAMPLES_DIR):
+    pymupdf = _import_pymupdf()
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for name, pages in SAMPLE_SPECS:
+        path = os.path.join(directory, f"{name}.pdf")
+        if not os.path.exists(path):
+            doc = pymupdf.open()
+            for page_num in range(pages):
+                page = doc.new_page()
+                page.insert_text((72, 64), f"{page_num + 1} Section {page_num}", fontsize=16)
+                rect = pymupdf.Rect(72, 90, page.rect.width - 72, page.rect.height - 72)
+                page.insert_textbox(rect, PARAGRAPH * 12, fontsize=10)
+            doc.save(path)
+            doc.close()
+        paths.append(path)
+    return paths
+
+
+def collect_pdfs(inputs):
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(sorted(glob.glob(os.path.join(item, "*.pdf"))))
+        else:
+            paths.append(item)
+    return paths
+
+
+def time_extraction(extract, paths, repeat):
+    pages = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for path in paths:
+            pages += sum(1 for _ in extract(path))
+    elapsed = time.perf_counter() - start
+    return {"pages": pages, "seconds": round(elapsed, 4), "pages_per_sec": round(pages / elapsed, 1)}
+
+
+def run(paths, repeat=3, processes=4):
+    results = {}
+    for name in BACKENDS:
+        backend = BACKENDS[name]()
+        try:
+            results[name] = time_extraction(backend.iter_pages, paths, repeat)
+        except ImportError as exc:
+            results[name] = {"error": str(exc)}
+            continue
+
+        # Same backend behind the process pool, splitting long documents into page ranges
+        extractor = PDFExtractor(backend=name, processes=processes)
+        # Warm up the worker processes on the longest document so spawn cost is not measured
+        for _ in range(processes):
+            extractor.extract_pages(max(paths, key=backend.page_count))
+        try:
+            results[f"{name}+pool{processes}"] = time_extraction(extractor.iter_pages, paths, repeat)
+        finally:
+            extractor.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("inputs", nargs="*", help="PDF files or directories (default: bundled samples)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    paths = collect_pdfs(args.inputs) if args.inputs else generate_samples()
+    results = run(paths, args.repeat, args.processes)
+
+    print(f"{len(paths)} PDFs x {args.repeat} runs")
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<20} unavailable: {result['error']}")
+        else:
+            print(f"{name:<20} {result['pages_per_sec']:>10.1f} pages/sec  ({result['pages']} pages in {result['seconds']}s)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump({"pdfs": paths, "repeat": args.repeat, "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
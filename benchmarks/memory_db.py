@@ -0,0 +1,97 @@
+# benchmarks/memory_db.py
+"""
+In-memory stand-in for db.db_init.Neo4jDatabase, so benchmarks run without a Neo4j
+server. Title and topic matching use the same embedding model and EmbeddingIndex
+as the real database, so title resolution costs are representative.
+"""
+import threading
+
+from app.model_registry import registry
+from db.db_init import parse_year
+from db.embedding_index import EmbeddingIndex
+
+
+class InMemoryDatabase:
+    def __init__(self, papers=()):
+        self.papers = {}
+        self.harvest_states = {}
+        self._title_index = EmbeddingIndex()
+        self._topic_index = EmbeddingIndex()
+        self._lock = threading.Lock()
+        if papers:
+            self.create_papers(papers)
+
+    def encode(self, texts):
+        return registry.embedding_model().encode(list(texts), convert_to_numpy=True, normalize_embeddings=True)
+
+    def ensure_schema(self):
+        pass
+
+    def create_paper(self, title, year, topic, url):
+        return self.create_papers([{"title": title, "year": year, "topic": topic, "url": url}])
+
+    def create_papers(self, papers):
+        with self._lock:
+            new = [dict(paper, year=parse_year(paper["year"])) for paper in papers if paper["url"] not in self.papers]
+            new = list({paper["url"]: paper for paper in new}.values())
+            if not new:
+                return 0
+            titles = [paper["title"] for paper in new]
+            topics = [paper["topic"] for paper in new]
+            vectors = self.encode(titles + topics)
+            self._title_index.add(titles, vectors[:len(titles)])
+            self._topic_index.add(topics, vectors[len(titles):])
+            self.papers.update((paper["url"], paper) for paper in new)
+            return len(new)
+
+    def count_papers(self):
+        return len(self.papers)
+
+    def delete_all_records(self):
+        with self._lock:
+            self.papers.clear()
+            self._title_index = EmbeddingIndex()
+            self._topic_index = EmbeddingIndex()
+
+    def query_papers(self, topic, year_from=None, year_to=None):
+        if not topic:
+            return None
+        topic = self.find_most_similar_topic(topic.lower())
+        year_from, year_to = parse_year(year_from), parse_year(year_to)
+        return [(paper["title"], paper["year"], paper["url"]) for paper in self.papers.values()
+                if paper["topic"] == topic
+                and (year_from is None or paper["year"] >= year_from)
+                and (year_to is None or paper["year"] <= year_to)]
+
+    def get_url(self, title):
+        return self.get_urls([title])[0]
+
+    def get_urls(self, titles):
+        urls = {paper["title"]: paper["url"] for paper in reversed(list(self.papers.values()))}
+        return [urls.get(title) for title in self.find_most_similar_titles(titles)]
+
+    def get_paper_metadata(self, urls):
+        return {url: {key: self.papers[url][key] for key in ("title", "year", "topic")}
+                for url in urls if url in self.papers}
+
+    def find_most_similar_topic(self, input_topic, threshold=0.75):
+        return self.find_most_similar_topics([input_topic], threshold)[0]
+
+    def find_most_similar_topics(self, input_topics, threshold=0.75):
+        return self._topic_index.search(self.encode(input_topics), threshold)
+
+    def find_most_similar_title(self, input_title, threshold=0.75):
+        return self.find_most_similar_titles([input_title], threshold)[0]
+
+    def find_most_similar_titles(self, input_titles, threshold=0.75):
+        return self._title_index.search(self.encode(input_titles), threshold)
+
+    def get_harvest_state(self, topic):
+        state = self.harvest_states.get(topic)
+        return dict(state) if state else None
+
+    def save_harvest_state(self, topic, **state):
+        current = self.harvest_states.setdefault(topic, {"topic": topic})
+        current.update(state)
+        for key in [key for key, value in current.items() if value is None]:
+            del current[key]
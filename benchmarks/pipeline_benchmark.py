@@ -0,0 +1,289 @@
+# benchmarks/pipeline_benchmark.py
+"""
+Offline end-to-end benchmark of the QA, summary and search pipelines.
+
+Run from the repository root:
+
+    python -m benchmarks.pipeline_benchmark [--repeat N] [--clients 1,4,16] [--json out.json]
+
+Nothing leaves the machine: the sample PDFs from benchmarks/samples/ are served by a
+local HTTP server, Neo4j is replaced by benchmarks.memory_db.InMemoryDatabase and
+caches live in a temporary directory. Models are the ones named by EMBEDDING_MODEL and
+GENERATION_MODEL, so small checkpoints already in the local Hugging Face cache keep a
+run short, e.g.
+
+    HF_HUB_OFFLINE=1 EMBEDDING_MODEL=sentence-transformers/paraphrase-MiniLM-L3-v2 \
+    GENERATION_MODEL=google/flan-t5-small python -m benchmarks.pipeline_benchmark
+
+The report covers per-stage latency (title resolution, fetch, extract, chunk, embed,
+retrieve, generate, summarize, search), request throughput of the FastAPI app under
+concurrent clients and peak RSS; --json writes it for comparison between commits.
+"""
+import argparse
+import functools
+import http.server
+import json
+import os
+import platform
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.extraction_benchmark import SAMPLES_DIR, generate_samples
+
+TOPIC = "retrieval augmented generation"
+QUESTIONS = [
+    "What method does the paper propose?",
+    "Which benchmarks are used in the evaluation?",
+    "How does the approach reduce latency?",
+    "What retrieval model is combined with the reader?",
+]
+
+
+def fixture_papers(paths, base_url):
+    papers = []
+    for year, path in enumerate(paths, start=2020):
+        name = os.path.splitext(os.path.basename(path))[0]
+        # The pipeline appends ".pdf" to stored URLs, as it does for arXiv abs links
+        papers.append({"title": f"Retrieval augmented generation for scientific QA ({name})",
+                       "year": year, "topic": TOPIC, "url": f"{base_url}/{name}"})
+    return papers
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_directory(directory):
+    handler = functools.partial(QuietHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, name="fixture-server", daemon=True).start()
+    return server
+
+
+def peak_rss_mb():
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    usage = {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        # PDF extraction worker processes
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    }
+    return {key: round(value, 1) for key, value in usage.items()}
+
+
+def summarize_latencies(samples):
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "mean_ms": round(1000 * statistics.fmean(samples), 2),
+        "p50_ms": round(1000 * samples[len(samples) // 2], 2),
+        "p95_ms": round(1000 * samples[min(len(samples) - 1, int(0.95 * len(samples)))], 2),
+        "max_ms": round(1000 * samples[-1], 2),
+    }
+
+
+def stage_latencies(pipeline, db, papers, repeat, summaries=True):
+    from app.agents.document import Document
+
+    timings = defaultdict(list)
+
+    def timed(stage, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        timings[stage].append(time.perf_counter() - start)
+        return result
+
+    for _ in range(repeat):
+        for paper in papers:
+            url = timed("title_resolution", pipeline.get_urls_from_titles, [paper["title"]])[0]
+            result = timed("fetch", pipeline.fetcher.fetch, url)
+            try:
+                pages = timed("extract", pipeline.extractor.extract_pages, result.path)
+            finally:
+                os.remove(result.path)
+            chunks = timed("chunk", pipeline.chunk_text_with_context, pages)
+            embeddings, index = timed("embed", pipeline.embed_chunks, chunks)
+            document = Document(url, pages, chunks, embeddings, index)
+            for question in QUESTIONS:
+                context_chunks = timed("retrieve", pipeline.retrieve_chunks_with_context, document, question)
+                timed("generate", pipeline.generate_answer_with_source, question, context_chunks)
+            if summaries:
+                timed("summarize", pipeline.summarizer.summarize_text, " ".join(page[1] for page in pages))
+            timed("search", db.query_papers, TOPIC)
+    return {stage: summarize_latencies(samples) for stage, samples in timings.items()}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_api(app):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=free_port(), log_level="warning"))
+    thread = threading.Thread(target=server.run, name="api-server", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("API server failed to start")
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+def client_throughput(api_url, papers, clients, requests_per_client):
+    import requests
+
+    def client(client_id):
+        latencies, statuses = [], defaultdict(int)
+        with requests.Session() as session:
+            for i in range(requests_per_client):
+                paper = papers[(client_id + i) % len(papers)]
+                question = QUESTIONS[(client_id * requests_per_client + i) % len(QUESTIONS)]
+                start = time.perf_counter()
+                response = session.get(f"{api_url}/answer_question_single/",
+                                       params={"question": question, "paper": paper["title"]})
+                latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] += 1
+        return latencies, statuses
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(client, range(clients)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for client_latencies, _ in results for latency in client_latencies]
+    statuses = defaultdict(int)
+    for _, client_statuses in results:
+        for status, count in client_statuses.items():
+            statuses[status] += count
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(len(latencies) / elapsed, 2),
+        "status_codes": {str(status): count for status, count in sorted(statuses.items())},
+        "latency": summarize_latencies(latencies),
+    }
+
+
+def api_throughput(papers, client_counts, requests_per_client, answer_cache):
+    from app import main
+
+    if not answer_cache:
+        # Similar benchmark questions would otherwise be answered from the cache
+        main.qa_agent.answer_cache.threshold = float("inf")
+    server, thread, api_url = start_api(main.app)
+    try:
+        # One request per paper first, so downloads and parsing are not part of the measurement
+        warmup = client_throughput(api_url, papers, len(papers), 1)
+        runs = [client_throughput(api_url, papers, clients, requests_per_client) for clients in client_counts]
+    finally:
+        server.should_exit = True
+        thread.join()
+    return {"warmup": warmup, "runs": runs}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                               check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    # Caches must point at a scratch directory before the pipeline modules are imported
+    scratch = tempfile.mkdtemp(prefix="pipeline-benchmark-")
+    os.environ["PAPER_CACHE_DIR"] = os.path.join(scratch, "paper_cache")
+    os.environ["SUMMARY_STORE_PATH"] = os.path.join(scratch, "summaries.sqlite3")
+
+    from benchmarks.memory_db import InMemoryDatabase
+    from db import db_init
+
+    server = serve_directory(SAMPLES_DIR)
+    paths = generate_samples()
+    papers = fixture_papers(paths, f"http://127.0.0.1:{server.server_address[1]}")
+
+    # Every agent gets the database from get_database(), so the stand-in must be installed first
+    db = db_init._database = InMemoryDatabase(papers)
+
+    from app.agents.fetcher import PaperFetcher
+    from app.agents.qa_agent import RAGPipeline
+    from app.model_registry import registry, DEFAULT_EMBEDDING_MODEL, DEFAULT_GENERATION_MODEL, GENERATION_BACKEND
+
+    report = {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "models": {"embedding": DEFAULT_EMBEDDING_MODEL, "generation": DEFAULT_GENERATION_MODEL,
+                   "generation_backend": GENERATION_BACKEND},
+        "pdfs": {os.path.basename(path): os.path.getsize(path) for path in paths},
+        "repeat": args.repeat,
+    }
+
+    start = time.perf_counter()
+    registry.embedding_model(DEFAULT_EMBEDDING_MODEL)
+    registry.generator(DEFAULT_GENERATION_MODEL, GENERATION_BACKEND)
+    report["model_load_seconds"] = round(time.perf_counter() - start, 3)
+
+    # A fetcher without a cache downloads every time, so each run measures the full path
+    pipeline = RAGPipeline(fetcher=PaperFetcher(cache=None))
+    report["stages"] = stage_latencies(pipeline, db, papers, args.repeat, summaries=not args.no_summaries)
+    pipeline.extractor.shutdown()
+    report["peak_rss_mb_after_stages"] = peak_rss_mb()
+
+    if args.clients:
+        report["api"] = api_throughput(papers, args.clients, args.requests_per_client, args.answer_cache)
+        report["peak_rss_mb_after_api"] = peak_rss_mb()
+
+    report["peak_rss_mb"] = peak_rss_mb()
+    server.shutdown()
+    return report
+
+
+def print_report(report):
+    print(f"commit {report['commit']}  models {report['models']['embedding']} / {report['models']['generation']}")
+    print(f"model load {report['model_load_seconds']}s")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:<18} n={stats['count']:<4} mean {stats['mean_ms']:>10.2f} ms  "
+              f"p50 {stats['p50_ms']:>10.2f} ms  p95 {stats['p95_ms']:>10.2f} ms")
+    for result in report.get("api", {}).get("runs", []):
+        print(f"{result['clients']:>3} clients  {result['requests_per_sec']:>8.2f} req/s  "
+              f"p50 {result['latency']['p50_ms']:>10.2f} ms  p95 {result['latency']['p95_ms']:>10.2f} ms  "
+              f"status {result['status_codes']}")
+    print(f"peak RSS {report['peak_rss_mb']['self']} MB (extraction workers {report['peak_rss_mb']['children']} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=1, help="passes over the sample PDFs for stage timings")
+    parser.add_argument("--clients", type=lambda value: [int(n) for n in value.split(",") if n], default=[1, 4],
+                        help="comma-separated concurrent client counts for the API run (empty to skip)")
+    parser.add_argument("--requests-per-client", type=int, default=4)
+    parser.add_argument("--no-summaries", action="store_true", help="skip the summarize stage")
+    parser.add_argument("--answer-cache", action="store_true", help="keep the semantic answer cache enabled")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
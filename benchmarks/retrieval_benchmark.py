@@ -0,0 +1,157 @@
+# benchmarks/retrieval_benchmark.py
+"""
+Compare hybrid retrieval (BM25 prefilter + dense re-scoring) with exact flat FAISS search.
+
+Run from the repository root:
+
+    python -m benchmarks.retrieval_benchmark [--papers 100] [--chunks-per-paper 30] [--candidates 50,200,1000]
+                                             [--cache-dir paper_cache] [--json out.json]
+
+The corpus is either every paper in a DocumentCache directory (--cache-dir) or a
+seeded synthetic one: papers on different topics whose chunks mix topic words with a
+shared vocabulary, embedded with EMBEDDING_MODEL. Queries are short word spans taken
+from random chunks. For each method the report lists index build time, per-query
+search latency (the question embedding is computed once, outside the timing),
+recall@k against the flat top-k and hit@k, the share of queries whose source chunk
+is among the top k.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from app.agents.corpus_index import CorpusIndex
+from app.agents.document import Chunk, Document
+from app.agents.hybrid_index import HybridIndex, RETRIEVAL_FUSION
+from app.model_registry import registry
+
+SYLLABLES = ["ka", "lo", "mi", "ren", "tor", "sa", "vel", "qui", "dra", "nex", "pho", "ul", "zen", "bri", "cor", "tam"]
+
+
+def make_vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))))
+    return sorted(words)
+
+
+def synthetic_documents(papers, chunks_per_paper, words_per_chunk, seed):
+    rng = random.Random(seed)
+    shared = make_vocabulary(rng, 400)
+    topics = [make_vocabulary(rng, 40) for _ in range(max(1, papers // 5))]
+    embedder = registry.embedding_model()
+
+    documents = []
+    for position in range(papers):
+        topic = topics[position % len(topics)]
+        chunks = []
+        for chunk_id in range(chunks_per_paper):
+            words = [rng.choice(topic) if rng.random() < 0.3 else rng.choice(shared) for _ in range(words_per_chunk)]
+            chunks.append(Chunk(chunk_id // 3 + 1, " ".join(words), f"Section {chunk_id // 6 + 1}"))
+        embeddings = embedder.encode([chunk.text for chunk in chunks], convert_to_numpy=True)
+        documents.append(Document(f"synthetic://paper-{position}.pdf", [], chunks, embeddings))
+    return documents
+
+
+def cached_documents(cache_dir):
+    from app.agents.doc_cache import DocumentCache
+
+    cache = DocumentCache(cache_dir)
+    documents = (cache.get(meta["url"]) for meta in cache.list_meta())
+    return [document for document in documents if document is not None and len(document.chunks)]
+
+
+def make_queries(documents, count, span, seed):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        document = rng.choice(documents)
+        chunk = rng.choice(document.chunks)
+        words = chunk.text.split()
+        start = rng.randrange(max(1, len(words) - span))
+        queries.append((" ".join(words[start:start + span]), chunk))
+    return queries
+
+
+def summarize_latencies(samples):
+    samples = sorted(samples)
+    return {
+        "mean_ms": round(1000 * statistics.fmean(samples), 3),
+        "p50_ms": round(1000 * samples[len(samples) // 2], 3),
+        "p95_ms": round(1000 * samples[min(len(samples) - 1, int(0.95 * len(samples)))], 3),
+    }
+
+
+def evaluate(search, queries, embeddings, k, reference=None):
+    latencies, results = [], []
+    for (question, _), embedding in zip(queries, embeddings):
+        start = time.perf_counter()
+        hits = search(question, embedding, k)
+        latencies.append(time.perf_counter() - start)
+        results.append([id(chunk) for _, chunk, _ in hits])
+
+    report = summarize_latencies(latencies)
+    report["hit_at_k"] = round(sum(id(source) in ids for (_, source), ids in zip(queries, results)) / len(queries), 3)
+    if reference is not None:
+        overlaps = [len(set(ids) & set(expected)) / max(len(expected), 1) for ids, expected in zip(results, reference)]
+        report["recall_at_k"] = round(statistics.fmean(overlaps), 3)
+    return report, results
+
+
+def run(documents, queries, k, candidates, fusion):
+    embeddings = registry.embedding_model().encode([question for question, _ in queries], convert_to_numpy=True)
+    total_chunks = sum(len(document.chunks) for document in documents)
+    report = {"papers": len(documents), "chunks": total_chunks, "queries": len(queries), "k": k, "methods": {}}
+
+    start = time.perf_counter()
+    flat = CorpusIndex(documents, "flat")
+    build_seconds = time.perf_counter() - start
+    result, reference = evaluate(lambda question, embedding, k: flat.search(embedding, k), queries, embeddings, k)
+    report["methods"]["flat"] = {"build_seconds": round(build_seconds, 3), **result, "recall_at_k": 1.0}
+
+    for count in candidates:
+        start = time.perf_counter()
+        hybrid = HybridIndex(documents, candidates=count, fusion=fusion)
+        build_seconds = time.perf_counter() - start
+        result, _ = evaluate(hybrid.search, queries, embeddings, k, reference)
+        report["methods"][f"hybrid@{count}"] = {"build_seconds": round(build_seconds, 3), **result}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cache-dir", help="benchmark on the papers in this DocumentCache directory")
+    parser.add_argument("--papers", type=int, default=100)
+    parser.add_argument("--chunks-per-paper", type=int, default=30)
+    parser.add_argument("--words-per-chunk", type=int, default=120)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--query-words", type=int, default=8)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--candidates", default="50,200,1000", help="comma-separated prefilter sizes")
+    parser.add_argument("--fusion", default=RETRIEVAL_FUSION)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    if args.cache_dir:
+        documents = cached_documents(args.cache_dir)
+    else:
+        documents = synthetic_documents(args.papers, args.chunks_per_paper, args.words_per_chunk, args.seed)
+    queries = make_queries(documents, args.queries, args.query_words, args.seed)
+    candidates = [int(count) for count in args.candidates.split(",") if count]
+    report = run(documents, queries, args.k, candidates, args.fusion)
+
+    print(f"{report['papers']} papers, {report['chunks']} chunks, {report['queries']} queries, k={args.k}, "
+          f"fusion {args.fusion}")
+    for method, result in report["methods"].items():
+        print(f"{method:<12} build {result['build_seconds']:>7.2f}s  mean {result['mean_ms']:>8.3f} ms  "
+              f"p95 {result['p95_ms']:>8.3f} ms  recall@k {result['recall_at_k']:.3f}  hit@k {result['hit_at_k']:.3f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
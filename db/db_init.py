@@ -1,52 +1,275 @@
 # db/db_init.py
+import os
+import threading
 from neo4j import GraphDatabase
-from sentence_transformers import SentenceTransformer, util
+from app.metrics import metrics
+from app.model_registry import registry
+from db.embedding_index import EmbeddingIndex
+
+NEO4J_URI = os.environ.get("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.environ.get("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.environ.get("NEO4J_PASSWORD", "Ashu@13016")
+
+# Run in order by ensure_schema(); every statement is idempotent
+MIGRATIONS = [
+    # Years used to be stored as strings such as "2021"
+    "MATCH (p:Paper) WHERE toString(p.year) = p.year SET p.year = toInteger(p.year)",
+    # CREATE-based ingestion could store the same paper several times; keep the first copy
+    "MATCH (p:Paper) WHERE p.url IS NOT NULL WITH p.url AS url, collect(p) AS papers "
+    "WHERE size(papers) > 1 UNWIND tail(papers) AS duplicate DETACH DELETE duplicate",
+    # Creation times drive the incremental title/topic index sync; older nodes count as created at 0
+    "MATCH (p:Paper) WHERE p.created_at IS NULL SET p.created_at = 0",
+]
+SCHEMA = [
+    "CREATE CONSTRAINT paper_url_unique IF NOT EXISTS FOR (p:Paper) REQUIRE p.url IS UNIQUE",
+    "CREATE INDEX paper_title IF NOT EXISTS FOR (p:Paper) ON (p.title)",
+    "CREATE INDEX paper_topic IF NOT EXISTS FOR (p:Paper) ON (p.topic)",
+    "CREATE INDEX paper_year IF NOT EXISTS FOR (p:Paper) ON (p.year)",
+    "CREATE INDEX paper_created_at IF NOT EXISTS FOR (p:Paper) ON (p.created_at)",
+    "CREATE CONSTRAINT harvest_topic_unique IF NOT EXISTS FOR (h:HarvestState) REQUIRE h.topic IS UNIQUE",
+]
+
+# Papers created up to this long before the newest indexed one are read again on each
+# sync, since concurrent writers can commit out of creation-time order
+INDEX_SYNC_OVERLAP_MS = int(os.environ.get("INDEX_SYNC_OVERLAP_MS", 5000))
+
+def parse_year(value):
+    """
+    Integer year from an int or a string such as "2021" or "2021-05-04T00:00:00Z".
+    """
+    if value is None or isinstance(value, int):
+        return value
+    try:
+        return int(str(value).strip()[:4])
+    except ValueError:
+        return None
 
 class Neo4jDatabase:
     def __init__(self, uri, user, password):
         self.driver = GraphDatabase.driver(uri, auth=(user, password))
-        self.embedder = SentenceTransformer('all-MiniLM-L6-v2')
+
+        # Title and topic vectors, loaded from the Paper nodes on first lookup
+        self._title_index = None
+        self._topic_index = None
+        # created_at (ms) of the newest Paper node in the indexes
+        self._indexed_until = None
+        self._index_lock = threading.Lock()
+
+        # Constraints, indexes and migrations are applied on first use
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    @property
+    def embedder(self):
+        # Shared with the RAG pipeline and loaded on first use
+        return registry.embedding_model()
     
     def close(self):
         self.driver.close()
 
+    def encode(self, texts):
+        return self.embedder.encode(list(texts), convert_to_numpy=True, normalize_embeddings=True)
+
+    def ensure_schema(self):
+        """
+        Migrate existing Paper nodes (string years, duplicate URLs), then create the
+        URL uniqueness constraint and the title, topic and year indexes. Safe to call
+        repeatedly; it runs automatically before the first read or write.
+        """
+        with self._schema_lock:
+            with self.driver.session() as session:
+                for statement in MIGRATIONS + SCHEMA:
+                    session.run(statement).consume()
+            self._schema_ready = True
+
+    def _ensure_schema(self):
+        if not self._schema_ready:
+            self.ensure_schema()
+
     def create_paper(self, title, year, topic, url):
+        return self.create_papers([{"title": title, "year": year, "topic": topic, "url": url}])
+
+    @metrics.timed("db.create_papers")
+    def create_papers(self, papers):
+        """
+        Insert papers (dicts with title, year, topic and url) in one transaction.
+        Papers are merged on their URL, so ingesting the same results again is a no-op.
+        Title and topic vectors are computed in one batched encode call and stored next
+        to the node. Returns the number of papers that were new.
+        """
+        papers = list({paper["url"]: paper for paper in papers}.values())
+        if not papers:
+            return 0
+        self._ensure_schema()
+
+        # Title and topic vectors are computed once here and stored next to the node
+        titles = list(dict.fromkeys(paper["title"] for paper in papers))
+        topics = list(dict.fromkeys(paper["topic"] for paper in papers))
+        vectors = self.encode(titles + topics)
+        title_vectors = dict(zip(titles, vectors[:len(titles)]))
+        topic_vectors = dict(zip(topics, vectors[len(titles):]))
+        rows = [{
+            "url": paper["url"], "title": paper["title"], "year": parse_year(paper["year"]), "topic": paper["topic"],
+            "title_embedding": title_vectors[paper["title"]].tolist(),
+            "topic_embedding": topic_vectors[paper["topic"]].tolist(),
+        } for paper in papers]
+
+        def write(tx):
+            return tx.run(
+                "UNWIND $rows AS row MERGE (p:Paper {url: row.url}) "
+                "ON CREATE SET p.title = row.title, p.year = row.year, p.topic = row.topic, p.created_at = timestamp(), "
+                "p.title_embedding = row.title_embedding, p.topic_embedding = row.topic_embedding",
+                rows=rows
+            ).consume().counters.nodes_created
+
         with self.driver.session() as session:
-            session.run(
-                "CREATE (p:Paper {title: $title, year: $year, topic: $topic, url: $url})",
-                title=title, year=year, topic=topic, url=url
-            )
+            created = session.execute_write(write)
+        with self._index_lock:
+            if self._title_index is not None and created:
+                self._title_index.add(titles, [title_vectors[title] for title in titles])
+                self._topic_index.add(topics, [topic_vectors[topic] for topic in topics])
+        return created
     
+    def get_harvest_state(self, topic):
+        """
+        Progress of the background arXiv harvest for `topic`, or None if none was started.
+        """
+        self._ensure_schema()
+        with self.driver.session() as session:
+            record = session.run("MATCH (h:HarvestState {topic: $topic}) RETURN h", topic=topic).single()
+        return dict(record["h"]) if record else None
+
+    def save_harvest_state(self, topic, **state):
+        # Properties set to None are removed from the node
+        self._ensure_schema()
+        with self.driver.session() as session:
+            session.run(
+                "MERGE (h:HarvestState {topic: $topic}) SET h += $state, h.updated_at = timestamp()",
+                topic=topic, state=state
+            ).consume()
+
     def delete_all_records(self):
         with self.driver.session() as session:
             session.run("MATCH (n) DETACH DELETE n")
+        self.refresh_embedding_indexes()
 
+    @metrics.timed("db.query_papers")
     def query_papers(self, topic, year_from=None, year_to=None):
-        if topic:
-            topic = topic.lower()
-            print(topic)
-            topic = self.find_most_similar_topic(topic)
-            print(topic)
+        if not topic:
+            return None
+        self._ensure_schema()
+        topic = self.find_most_similar_topic(topic.lower())
 
+        # Served by the topic index; years are integers, so either bound may be open
         with self.driver.session() as session:
-            if topic and year_from and year_to:
-                result = session.run(
-                    "MATCH (p:Paper {topic: $topic}) WHERE $year_from <= p.year <= $year_to RETURN p.title, p.year, p.url",
-                    topic=str(topic), year_from=str(year_from), year_to=str(year_to)
-                )
-            elif topic:
-                result = session.run("MATCH (p:Paper {topic: $topic}) RETURN p.title, p.year, p.url", topic=str(topic))
-            else:
-                return None
+            result = session.run(
+                "MATCH (p:Paper {topic: $topic}) "
+                "WHERE ($year_from IS NULL OR p.year >= $year_from) AND ($year_to IS NULL OR p.year <= $year_to) "
+                "RETURN p.title, p.year, p.url",
+                topic=str(topic), year_from=parse_year(year_from), year_to=parse_year(year_to)
+            )
             return [(record["p.title"], record["p.year"], record["p.url"]) for record in result]
     
+    @metrics.timed("db.get_url")
     def get_url(self, title):
         with self.driver.session() as session:
-            print(title)
             title = self.find_most_similar_title(title)
-            print(title)
+            if title is None:
+                return None
             result = session.run("MATCH (p:Paper {title: $title}) RETURN p.url", title=str(title))
-            return result.single()[0]
+            record = result.single()
+            return record[0] if record is not None else None
+
+    @metrics.timed("db.get_urls")
+    def get_urls(self, titles):
+        """
+        Resolve several user-provided titles in one batch: one encode call for all of
+        them, one index search and one Cypher round trip.
+        """
+        matched = self.find_most_similar_titles(titles)
+        with self.driver.session() as session:
+            result = session.run(
+                "UNWIND $titles AS title MATCH (p:Paper {title: title}) RETURN title, head(collect(p.url)) AS url",
+                titles=[title for title in matched if title is not None]
+            )
+            urls = {record["title"]: record["url"] for record in result}
+        return [urls.get(title) for title in matched]
+
+    @metrics.timed("db.get_paper_metadata")
+    def get_paper_metadata(self, urls):
+        """
+        Title, year and topic of the papers stored under `urls`, as a dict keyed by
+        URL; unknown URLs are left out. One round trip, served by the url constraint.
+        """
+        with self.driver.session() as session:
+            result = session.run(
+                "UNWIND $urls AS url MATCH (p:Paper {url: url}) "
+                "RETURN url, p.title AS title, p.year AS year, p.topic AS topic",
+                urls=list(urls)
+            )
+            return {record["url"]: {"title": record["title"], "year": record["year"], "topic": record["topic"]}
+                    for record in result}
+
+    def count_papers(self):
+        with self.driver.session() as session:
+            return session.run("MATCH (p:Paper) RETURN count(p) AS total").single()["total"]
+
+    def refresh_embedding_indexes(self):
+        with self._index_lock:
+            self._title_index = None
+            self._topic_index = None
+            self._indexed_until = None
+
+    def _read_embeddings(self, session, key, prop, since):
+        # One row per distinct name, with the newest creation time among its nodes
+        where = f"p.{key} IS NOT NULL" + (" AND p.created_at >= $since" if since is not None else "")
+        records = list(session.run(
+            f"MATCH (p:Paper) WHERE {where} "
+            f"RETURN p.{key} AS name, head(collect(p.{prop})) AS embedding, max(p.created_at) AS newest",
+            since=since))
+        rows = self._fill_missing_embeddings(session, [(record["name"], record["embedding"]) for record in records],
+                                             key, prop)
+        return rows, max((record["newest"] or 0 for record in records), default=None)
+
+    @metrics.timed("db.sync_embedding_indexes")
+    def _ensure_embedding_indexes(self):
+        """
+        Keep the in-process title and topic indexes in step with the Paper nodes. The
+        first call loads every stored vector; later calls only read nodes created
+        since the newest one already indexed (e.g. papers harvested by another worker),
+        through the created_at index. Nodes created before vectors were stored are
+        embedded once and written back.
+        """
+        self._ensure_schema()
+        with self._index_lock:
+            if self._title_index is None:
+                title_index, topic_index, since = EmbeddingIndex(), EmbeddingIndex(), None
+            else:
+                title_index, topic_index = self._title_index, self._topic_index
+                since = (self._indexed_until or 0) - INDEX_SYNC_OVERLAP_MS
+            with self.driver.session() as session:
+                titles, newest_title = self._read_embeddings(session, "title", "title_embedding", since)
+                topics, newest_topic = self._read_embeddings(session, "topic", "topic_embedding", since)
+            # EmbeddingIndex skips names it already holds
+            if titles:
+                title_index.add([name for name, _ in titles], [vector for _, vector in titles])
+            if topics:
+                topic_index.add([name for name, _ in topics], [vector for _, vector in topics])
+            self._title_index = title_index
+            self._topic_index = topic_index
+            newest = [value for value in (self._indexed_until, newest_title, newest_topic) if value is not None]
+            self._indexed_until = max(newest, default=None)
+
+    def _fill_missing_embeddings(self, session, rows, key, prop):
+        missing = [name for name, vector in rows if vector is None]
+        if not missing:
+            return rows
+        vectors = dict(zip(missing, self.encode(missing)))
+        session.run(
+            f"UNWIND $rows AS row MATCH (p:Paper {{{key}: row.name}}) SET p.{prop} = row.embedding",
+            rows=[{"name": name, "embedding": vector.tolist()} for name, vector in vectors.items()]
+        )
+        return [(name, vector if vector is not None else vectors[name]) for name, vector in rows]
     
     def get_stored_topics(self):
         """
@@ -71,28 +294,16 @@ class Neo4jDatabase:
         Returns:
             str or None: The most similar topic name or None if no match is found.
         """
-        # Get all stored topics
-        stored_topics = self.get_stored_topics()
-        if stored_topics is None or len(stored_topics) == 0:
-            return None
+        return self.find_most_similar_topics([input_topic], threshold)[0]
 
-        # Embed the input topic
-        input_embedding = self.embedder.encode(input_topic, convert_to_tensor=True)
-
-        # Embed each stored topic
-        stored_embeddings = self.embedder.encode(stored_topics, convert_to_tensor=True)
-
-        # Compute cosine similarity
-        similarities = util.pytorch_cos_sim(input_embedding, stored_embeddings).squeeze()
+    @metrics.timed("db.match_topics")
+    def find_most_similar_topics(self, input_topics, threshold=0.75):
+        """
+        Batched variant of find_most_similar_topic: one encode call and one index search.
+        """
+        self._ensure_embedding_indexes()
+        return self._topic_index.search(self.encode(input_topics), threshold)
 
-        # Find the best match above the threshold
-        best_score = similarities.max().item()
-        if best_score >= threshold:
-            best_match_index = similarities.argmax().item()
-            return stored_topics[best_match_index]
-        else:
-            return None
-        
     def get_stored_titles(self):
         """
         Retrieve stored paper titles from the Neo4j database.
@@ -116,25 +327,26 @@ class Neo4jDatabase:
         Returns:
             str or None: The most similar title or None if no match is found.
         """
-        # Get all stored titles
-        stored_titles = self.get_stored_titles()
-        if stored_titles is None or len(stored_titles) == 0:
-            return None
+        return self.find_most_similar_titles([input_title], threshold)[0]
 
-        # Embed the input title
-        input_embedding = self.embedder.encode(input_title, convert_to_tensor=True)
+    @metrics.timed("db.match_titles")
+    def find_most_similar_titles(self, input_titles, threshold=0.75):
+        """
+        Batched variant of find_most_similar_title: one encode call and one index search.
+        """
+        self._ensure_embedding_indexes()
+        return self._title_index.search(self.encode(input_titles), threshold)
 
-        # Embed each stored title
-        stored_embeddings = self.embedder.encode(stored_titles, convert_to_tensor=True)
 
-        # Compute cosine similarity
-        similarities = util.pytorch_cos_sim(input_embedding, stored_embeddings).squeeze()
+_database = None
+_database_lock = threading.Lock()
 
-        # Find the best match above the threshold
-        best_score = similarities.max().item()
-        if best_score >= threshold:
-            best_match_index = similarities.argmax().item()
-            return stored_titles[best_match_index]
-        else:
-            return None
-        
+def get_database():
+    """
+    Returns the process-wide Neo4jDatabase instance shared by all agents.
+    """
+    global _database
+    with _database_lock:
+        if _database is None:
+            _database = Neo4jDatabase(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+        return _database
@@ -0,0 +1,63 @@
+# db/embedding_index.py
+import threading
+
+import faiss
+import numpy as np
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype="float32")
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class EmbeddingIndex:
+    """
+    Incrementally maintained nearest-neighbour index over a set of names.
+
+    Vectors are L2-normalized so the inner product returned by FAISS is the cosine
+    similarity, which keeps thresholds compatible with `util.pytorch_cos_sim`.
+    """
+
+    def __init__(self, hnsw_neighbors=32):
+        self.hnsw_neighbors = hnsw_neighbors
+        self.index = None
+        self.names = []
+        self._known = set()
+        self._lock = threading.Lock()
+
+    def add(self, names, vectors):
+        vectors = normalize(vectors)
+        with self._lock:
+            if self.index is None:
+                self.index = faiss.IndexHNSWFlat(vectors.shape[1], self.hnsw_neighbors, faiss.METRIC_INNER_PRODUCT)
+            keep = []
+            for position, name in enumerate(names):
+                if name is None or name in self._known:
+                    continue
+                self._known.add(name)
+                self.names.append(name)
+                keep.append(position)
+            if keep:
+                self.index.add(vectors[keep])
+
+    def search(self, vectors, threshold):
+        """
+        Returns, for every query vector, the closest name whose cosine similarity is at
+        least `threshold`, or None.
+        """
+        vectors = normalize(vectors)
+        with self._lock:
+            if self.index is None or self.index.ntotal == 0:
+                return [None] * len(vectors)
+            scores, indices = self.index.search(vectors, 1)
+        return [
+            self.names[idx] if idx >= 0 and score >= threshold else None
+            for score, idx in zip(scores[:, 0], indices[:, 0])
+        ]
+
+    def __len__(self):
+        return len(self.names)
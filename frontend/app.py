@@ -1,4 +1,5 @@
 # frontend/app.py
+import json
 import streamlit as st
 import requests
 
@@ -104,6 +105,58 @@ def generate_future_work(papers):
     ideas = response.json().get("future_work_ideas", "")
     return ideas if ideas else "No future work ideas available"
 
+def stream_events(response):
+    # Parse a server-sent events response into the JSON payload of each event
+    for line in response.iter_lines(decode_unicode=True):
+        if line and line.startswith("data: "):
+            yield json.loads(line[len("data: "):])
+
+def render_stream(response, label):
+    """
+    Render progress, tokens and per-paper summaries as they arrive and return the
+    final "done" event.
+    """
+    status = st.empty()
+    output = st.empty()
+    text = ""
+    for event in stream_events(response):
+        kind = event["event"]
+        if kind == "progress":
+            status.caption(f"{event['stage'].capitalize()}...")
+        elif kind == "token":
+            text += event["text"]
+            output.markdown(f"**{label}** {text}")
+        elif kind == "summary":
+            text += f"\n\n**Summary from {event['paper_name']}:**\n{event['summary']}"
+            output.markdown(text)
+        elif kind == "error":
+            status.empty()
+            st.error(event["detail"])
+            return None
+        elif kind == "done":
+            status.empty()
+            # Cached answers arrive whole in the "done" event, without any tokens
+            result = event.get("answer") or event.get("future_work_ideas")
+            if not text and result:
+                output.markdown(f"**{label}** {result}")
+            return event
+    return None
+
+def stream_answer(question, paper):
+    with requests.get(f"{backend_url}/answer_question_single_stream/",
+                      params={"question": question, "paper": paper}, stream=True) as response:
+        event = render_stream(response, "Answer:")
+    if event and event.get('source_heading'):
+        st.caption(f"Source heading: {event['source_heading']}")
+
+def stream_summaries(papers):
+    with requests.post(f"{backend_url}/summarize_papers_multi_stream/", json={"papers": papers}, stream=True) as response:
+        render_stream(response, "Summary:")
+
+def stream_future_work(papers):
+    with requests.post(f"{backend_url}/generate_future_work_multi_stream/", json={"papers": papers}, stream=True) as response:
+        render_stream(response, "Future Work Ideas:")
+
 # Display input fields for each paper
 for i, title in enumerate(st.session_state["paper_titles"]):
     st.session_state["paper_titles"][i] = st.text_input(f"Paper Title {i + 1}", title)
@@ -111,23 +164,35 @@ for i, title in enumerate(st.session_state["paper_titles"]):
 # Button to add new paper input field
 st.button("+ Add another paper", on_click=add_paper)
 
+# Streamed responses show progress and text while the backend is still generating
+use_streaming = st.checkbox("Stream responses", value=True)
+
 # Display a question input for Q&A
 st.subheader("Ask a Question about the Papers")
 question = st.text_input("Question")
 
 # Ask question button
 if st.button("Ask Question"):
-    answer = ask_question(question, st.session_state["paper_titles"])
-    st.write("Answer:", answer)
+    if use_streaming and len(st.session_state["paper_titles"]) == 1:
+        stream_answer(question, st.session_state["paper_titles"][0])
+    else:
+        answer = ask_question(question, st.session_state["paper_titles"])
+        st.write("Answer:", answer)
 
 # Summarize button
 st.subheader("Summarize Papers")
 if st.button("Get Summary"):
-    summary = summarize_papers(st.session_state["paper_titles"])
-    st.write("Summary:", summary)
+    if use_streaming:
+        stream_summaries(st.session_state["paper_titles"])
+    else:
+        summary = summarize_papers(st.session_state["paper_titles"])
+        st.write("Summary:", summary)
 
 # Future work ideas button
 st.subheader("Get Future Work Ideas")
 if st.button("Get Future Work Ideas"):
-    ideas = generate_future_work(st.session_state["paper_titles"])
-    st.write("Future Work Ideas:", ideas)
\ No newline at end of file
+    if use_streaming:
+        stream_future_work(st.session_state["paper_titles"])
+    else:
+        ideas = generate_future_work(st.session_state["paper_titles"])
+        st.write("Future Work Ideas:", ideas)
\ No newline at end of file
@@ -0,0 +1,56 @@
+import http.server
+import threading
+
+import pytest
+
+
+class StubServer:
+    """
+    Local HTTP server whose GET responses come from `handle(request)`, which returns
+    (status, headers, body) or writes the response itself and returns None. Every
+    request is recorded in `requests` as (path, headers).
+    """
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.requests = []
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests.append((self.path, dict(self.headers)))
+                response = stub.handle(self)
+                if response is None:
+                    return
+                status, headers, body = response
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def start(handle):
+        server = StubServer(handle)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
@@ -0,0 +1,138 @@
+import io
+from urllib.parse import parse_qs, urlparse
+
+from app.agents.arxiv_harvester import ArxivHarvester, RateLimiter, parse_feed
+
+FEED = (
+    '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">'
+    "<opensearch:totalResults>{total}</opensearch:totalResults>{entries}</feed>"
+)
+ENTRY = ("<entry><id>http://arxiv.org/abs/2101.{number:05d}</id><published>2021-01-01T00:00:00Z</published>"
+         "<title>Paper\n  {number}</title></entry>")
+ERROR_ENTRY = ("<entry><id>http://arxiv.org/api/errors#incorrect_id_format</id>"
+               "<title>Error</title><summary>incorrect id format</summary></entry>")
+
+
+def feed(total, numbers, error=False):
+    entries = "".join(ENTRY.format(number=number) for number in numbers)
+    return FEED.format(total=total, entries=ERROR_ENTRY if error else entries).encode("utf-8")
+
+
+class FakeDatabase:
+    def __init__(self, state=None):
+        self.papers = []
+        self.state = dict(state) if state else None
+
+    def create_papers(self, papers):
+        self.papers.extend(papers)
+        return len(papers)
+
+    def get_harvest_state(self, topic):
+        return dict(self.state) if self.state else None
+
+    def save_harvest_state(self, topic, **state):
+        self.state = {**(self.state or {"topic": topic}), **state}
+
+
+def arxiv_stub(stub_server, total, short_page=None):
+    """
+    Serves `total` results; pages are cut to `short_page` entries, as arXiv sometimes does.
+    """
+    def handle(request):
+        query = parse_qs(urlparse(request.path).query)
+        start, size = int(query["start"][0]), int(query["max_results"][0])
+        if short_page is not None:
+            size = min(size, short_page)
+        return 200, {"Content-Type": "application/atom+xml"}, feed(total, range(start, min(start + size, total)))
+
+    return stub_server(handle)
+
+
+def requested(server, name):
+    return [int(parse_qs(urlparse(path).query)[name][0]) for path, _ in server.requests]
+
+
+def make_harvester(server, db, page_size=3):
+    return ArxivHarvester(db, api_url=f"{server.url}/api/query", page_size=page_size, rate_limiter=RateLimiter(0))
+
+
+def test_parse_feed_reads_entries_and_total():
+    totals = []
+    papers = list(parse_feed(io.BytesIO(feed(12, [1, 2])), "nlp", totals.append))
+
+    assert totals == [12]
+    assert papers == [
+        {"title": "Paper 1", "year": 2021, "topic": "nlp", "url": "http://arxiv.org/abs/2101.00001"},
+        {"title": "Paper 2", "year": 2021, "topic": "nlp", "url": "http://arxiv.org/abs/2101.00002"},
+    ]
+
+
+def test_parse_feed_skips_error_entry():
+    assert list(parse_feed(io.BytesIO(feed(1, [], error=True)), "nlp")) == []
+
+
+def test_harvest_follows_short_pages_until_total(stub_server):
+    server = arxiv_stub(stub_server, total=7, short_page=2)
+    db = FakeDatabase()
+
+    created = make_harvester(server, db).harvest("nlp")
+
+    assert created == 7
+    assert [paper["url"][-1] for paper in db.papers] == list("0123456")
+    # Each page continues from what was actually received and nothing is requested past the total
+    assert requested(server, "start") == [0, 2, 4, 6]
+
+
+def test_harvest_caps_at_max_results(stub_server):
+    server = arxiv_stub(stub_server, total=50)
+    db = FakeDatabase()
+
+    created = make_harvester(server, db).harvest("nlp", max_results=4)
+
+    assert created == 4
+    assert requested(server, "max_results") == [3, 1]
+
+
+def test_harvest_stops_on_error_entry(stub_server):
+    server = stub_server(lambda request: (200, {}, feed(1, [], error=True)))
+    db = FakeDatabase()
+
+    assert make_harvester(server, db).harvest("bad:query") == 0
+    assert len(server.requests) == 1
+
+
+def run_background(harvester, topic, **kwargs):
+    status = harvester.start_background(topic, **kwargs)
+    job = harvester._jobs.get(topic)
+    if job is not None:
+        job.thread.join(timeout=10)
+    return status
+
+
+def test_start_background_resumes_from_checkpoint(stub_server):
+    server = arxiv_stub(stub_server, total=8)
+    db = FakeDatabase({"topic": "nlp", "status": "stopped", "next_start": 5, "max_results": None})
+    harvester = make_harvester(server, db)
+
+    run_background(harvester, "nlp")
+
+    assert requested(server, "start") == [5]
+    assert [paper["url"][-1] for paper in db.papers] == list("567")
+    assert db.state["status"] == "done"
+    assert db.state["next_start"] == 8
+    assert server.requests and "sortBy=submittedDate" in server.requests[0][0]
+
+
+def test_start_background_skips_done_topic_unless_restarted(stub_server):
+    server = arxiv_stub(stub_server, total=4)
+    db = FakeDatabase({"topic": "nlp", "status": "done", "next_start": 4, "max_results": None})
+    harvester = make_harvester(server, db)
+
+    status = run_background(harvester, "nlp")
+    assert status["status"] == "done"
+    assert server.requests == []
+
+    run_background(harvester, "nlp", restart=True)
+    assert requested(server, "start") == [0, 3]
+    assert len(db.papers) == 4
+    assert db.state["status"] == "done"
@@ -0,0 +1,36 @@
+import os
+
+import faiss
+import numpy as np
+
+from app.agents.doc_cache import DocumentCache
+
+
+def store(cache, url, body):
+    staged = os.path.join(cache.cache_dir, "incoming.pdf")
+    with open(staged, "wb") as file:
+        file.write(body)
+    embeddings = np.ones((1, 4), dtype="float32")
+    index = faiss.IndexFlatL2(4)
+    index.add(embeddings)
+    return cache.put(url, staged, [(0, "text", [])], [(0, "text", None)], embeddings, index)
+
+
+def listed(cache):
+    return [(meta["url"], meta["content_hash"]) for meta in cache.list_meta()]
+
+
+def test_list_meta_sees_entries_written_by_other_workers(tmp_path):
+    # Two caches on one directory stand in for two server processes
+    worker, other = DocumentCache(str(tmp_path)), DocumentCache(str(tmp_path))
+    store(worker, "a.pdf", b"a")
+    assert [url for url, _ in listed(worker)] == ["a.pdf"]
+
+    store(other, "b.pdf", b"b")
+    assert [url for url, _ in listed(worker)] == ["a.pdf", "b.pdf"]
+
+    rebuilt = store(other, "a.pdf", b"a, revised")
+    assert listed(worker)[0] == ("a.pdf", rebuilt.meta["content_hash"])
+
+    other.invalidate("b.pdf")
+    assert [url for url, _ in listed(worker)] == ["a.pdf"]
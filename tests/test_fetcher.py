@@ -0,0 +1,210 @@
+import os
+
+import faiss
+import numpy as np
+import pytest
+import requests
+
+from app.agents.doc_cache import DocumentCache, file_sha256
+from app.agents.fetcher import PaperFetcher
+from app.model_registry import registry
+
+BODY = bytes(range(256)) * 1024  # 256 KiB
+
+
+def serve_body(request):
+    return 200, {"Content-Type": "application/pdf", "ETag": '"v1"'}, BODY
+
+
+def read(path):
+    with open(path, "rb") as file:
+        return file.read()
+
+
+def cache_entry(cache, url, body, fingerprint=None):
+    staged = os.path.join(cache.cache_dir, "incoming.pdf")
+    with open(staged, "wb") as file:
+        file.write(body)
+    embeddings = np.ones((1, 4), dtype="float32")
+    index = faiss.IndexFlatL2(4)
+    index.add(embeddings)
+    return cache.put(url, staged, [(0, "text", [])], [(0, "text", None)], embeddings, index, etag='"v1"',
+                     fingerprint=fingerprint)
+
+
+def test_fetch_streams_body_to_disk(stub_server):
+    server = stub_server(serve_body)
+    fetcher = PaperFetcher(chunk_size=1024)
+
+    result = fetcher.fetch(f"{server.url}/paper.pdf")
+    try:
+        assert read(result.path) == BODY
+        assert result.etag == '"v1"'
+        assert not result.not_modified
+    finally:
+        os.remove(result.path)
+
+
+def test_fetch_retries_server_errors(stub_server):
+    def flaky(request):
+        if len(server.requests) <= 2:
+            return 503, {}, b"busy"
+        return serve_body(request)
+
+    server = stub_server(flaky)
+    fetcher = PaperFetcher(max_retries=3, backoff_factor=0)
+
+    result = fetcher.fetch(f"{server.url}/paper.pdf")
+    os.remove(result.path)
+    assert len(server.requests) == 3
+
+
+def test_fetch_gives_up_after_max_retries(stub_server):
+    server = stub_server(lambda request: (500, {}, b"broken"))
+    fetcher = PaperFetcher(max_retries=1, backoff_factor=0)
+
+    with pytest.raises(requests.RequestException):
+        fetcher.fetch(f"{server.url}/paper.pdf")
+    assert len(server.requests) == 2
+
+
+def test_fetch_retries_dropped_connections_once_per_attempt(stub_server):
+    def hang_up(request):
+        request.close_connection = True
+        return None
+
+    server = stub_server(hang_up)
+    fetcher = PaperFetcher(max_retries=3, backoff_factor=0)
+
+    with pytest.raises(requests.ConnectionError):
+        fetcher.fetch(f"{server.url}/paper.pdf")
+    assert len(server.requests) == 4
+
+
+def test_fetch_retries_truncated_body(stub_server):
+    def truncated_once(request):
+        if len(server.requests) > 1:
+            return serve_body(request)
+        request.send_response(200)
+        request.send_header("Content-Length", str(len(BODY)))
+        request.end_headers()
+        request.wfile.write(BODY[:1000])
+        request.close_connection = True
+        return None
+
+    server = stub_server(truncated_once)
+    fetcher = PaperFetcher(max_retries=2, backoff_factor=0)
+
+    result = fetcher.fetch(f"{server.url}/paper.pdf")
+    try:
+        assert read(result.path) == BODY
+        assert len(server.requests) == 2
+    finally:
+        os.remove(result.path)
+
+
+def test_fetch_sends_validators_and_handles_not_modified(stub_server, tmp_path):
+    def conditional(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            return 304, {"ETag": '"v1"'}, b""
+        return serve_body(request)
+
+    server = stub_server(conditional)
+    url = f"{server.url}/paper.pdf"
+    cache = DocumentCache(str(tmp_path / "cache"))
+    cache_entry(cache, url, BODY)
+    fetcher = PaperFetcher(cache)
+
+    result = fetcher.fetch(url)
+    assert result.not_modified
+    assert result.path == cache.pdf_path(url)
+    assert server.requests[0][1]["If-None-Match"] == '"v1"'
+
+
+EMBEDDING_MODEL = "stub/embedder"
+
+
+class StubEmbedder:
+    tokenizer = None  # chunk by whitespace words
+
+    def encode(self, texts, **kwargs):
+        return np.ones((len(texts), 4), dtype="float32")
+
+    def get_sentence_embedding_dimension(self):
+        return 4
+
+
+class FailingExtractor:
+    def iter_pages(self, pdf_path):
+        raise AssertionError("an unchanged paper must not be parsed again")
+
+
+class StubExtractor:
+    def __init__(self, text="fresh page text"):
+        self.text = text
+
+    def iter_pages(self, pdf_path):
+        yield 0, self.text, []
+
+
+@pytest.fixture(autouse=True)
+def stub_embedder():
+    registry._models[("embedding", EMBEDDING_MODEL)] = StubEmbedder()
+    yield
+    registry._models.pop(("embedding", EMBEDDING_MODEL), None)
+
+
+def make_pipeline(cache, extractor=None):
+    from app.agents.qa_agent import RAGPipeline
+    from app.agents.summary_store import SummaryStore
+
+    return RAGPipeline(embedding_model_name=EMBEDDING_MODEL, chunk_tokens=64, cache=cache,
+                       fetcher=PaperFetcher(cache, revalidate_after=0, backoff_factor=0),
+                       extractor=extractor or FailingExtractor(),
+                       summary_store=SummaryStore(path=os.path.join(cache.cache_dir, "summaries.sqlite3")))
+
+
+@pytest.mark.parametrize("status", [304, 200])
+def test_stale_paper_is_revalidated_without_rebuilding(stub_server, tmp_path, status):
+    # 304 from the server, or a full response whose content hash matches the cached PDF
+    server = stub_server(lambda request: (304, {}, b"") if status == 304 else (200, {}, BODY))
+    url = f"{server.url}/paper.pdf"
+    cache = DocumentCache(str(tmp_path / "cache"))
+    pipeline = make_pipeline(cache)
+    cached = cache_entry(cache, url, BODY, pipeline.document_fingerprint)
+
+    document = pipeline.load_paper(url)
+
+    assert document.chunks == cached.chunks
+    assert document.meta["content_hash"] == file_sha256(cache.pdf_path(url))
+    assert "validated_at" in document.meta
+    assert len(server.requests) == 1
+
+
+@pytest.mark.parametrize("status", [304, 200])
+def test_paper_cached_with_other_chunking_is_rebuilt(stub_server, tmp_path, status):
+    server = stub_server(lambda request: (304, {}, b"") if status == 304 else (200, {}, BODY))
+    url = f"{server.url}/paper.pdf"
+    cache = DocumentCache(str(tmp_path / "cache"))
+    pipeline = make_pipeline(cache, StubExtractor())
+    cache_entry(cache, url, BODY, {**pipeline.document_fingerprint, "chunk_tokens": 128})
+
+    document = pipeline.load_paper(url)
+
+    assert [chunk.text for chunk in document.chunks] == ["fresh page text"]
+    assert document.meta["fingerprint"] == pipeline.document_fingerprint
+    assert read(cache.pdf_path(url)) == BODY
+
+
+def test_paper_without_text_is_cached_empty(stub_server, tmp_path):
+    # e.g. a scanned PDF without a text layer
+    server = stub_server(serve_body)
+    cache = DocumentCache(str(tmp_path / "cache"))
+    pipeline = make_pipeline(cache, StubExtractor(text=""))
+
+    document = pipeline.load_paper(f"{server.url}/paper.pdf")
+
+    assert document.chunks == ()
+    assert document.embeddings.shape == (0, 4)
+    assert document.index.ntotal == 0
+    assert pipeline.retrieve_chunks_with_context(document, "anything", question_embedding=np.ones(4)) == []
@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+import torch
+from transformers import BatchEncoding
+
+from app.agents.generation import GenerationBatcher, QueueFullError
+from app.model_registry import registry
+
+MODEL_NAME = "stub/streaming-model"
+
+
+class StubTokenizer:
+    def __call__(self, text, return_tensors=None, **kwargs):
+        ids = [[2 + len(word) for word in text.split()] or [2]]
+        return BatchEncoding({"input_ids": torch.tensor(ids) if return_tensors == "pt" else ids[0]})
+
+    def decode(self, ids, **kwargs):
+        return "".join(f"t{int(i)} " for i in ids)
+
+
+class StubModel:
+    """
+    Streams one token, then blocks until `release` is set.
+    """
+
+    device = "cpu"
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def generate(self, input_ids, streamer, **kwargs):
+        streamer.put(input_ids)  # the prompt, skipped by the streamer
+        streamer.put(torch.tensor([7]))
+        self.release.wait(timeout=10)
+        streamer.put(torch.tensor([8]))
+        streamer.end()
+
+
+@pytest.fixture
+def stub_model():
+    model = StubModel()
+    registry._models[("generator", MODEL_NAME, "torch")] = (StubTokenizer(), model)
+    yield model
+    model.release.set()
+    registry._models.pop(("generator", MODEL_NAME, "torch"), None)
+
+
+def test_stream_rejects_beyond_max_streams(stub_model):
+    batcher = GenerationBatcher(MODEL_NAME, backend="torch", max_streams=1)
+
+    first = batcher.stream("a prompt", max_length=8)
+    assert next(first) == "t7 "
+    assert batcher.stats()["active_streams"] == 1
+
+    with pytest.raises(QueueFullError):
+        next(batcher.stream("another prompt", max_length=8))
+    assert batcher.stats()["rejected"] == 1
+
+    stub_model.release.set()
+    assert list(first) == ["t8 "]
+    assert batcher.stats()["active_streams"] == 0
+    # The slot is free again once the first generation has finished
+    assert list(batcher.stream("a third prompt", max_length=8)) == ["t7 ", "t8 "]
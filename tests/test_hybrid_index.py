@@ -0,0 +1,49 @@
+import numpy as np
+
+from app.agents.document import Chunk, Document
+from app.agents.hybrid_index import HybridIndex
+
+WORDS = ["attention", "graph", "kernel", "protein", "retrieval", "sparse", "token", "vision"]
+
+
+def make_document(number, chunks=4):
+    rng = np.random.default_rng(number)
+    texts = [" ".join(rng.choice(WORDS, size=6)) for _ in range(chunks)]
+    embeddings = rng.normal(size=(chunks, 8)).astype("float32")
+    return Document(f"paper-{number}", [(0, " ".join(texts))], [Chunk(0, text) for text in texts], embeddings)
+
+
+def ranked(index, question="sparse attention kernel", k=5, papers=None):
+    query = np.linspace(-1, 1, 8, dtype="float32")
+    return [(index.urls[position], chunk.text, round(score, 6))
+            for position, chunk, score in index.search(question, query, k, papers)]
+
+
+def test_incremental_updates_match_a_fresh_build():
+    documents = [make_document(number) for number in range(6)]
+    index = HybridIndex(documents[:3], fusion="linear")
+    index.add_documents(documents[3:])
+    index.remove("paper-1")
+    index.remove("paper-4")
+
+    fresh = HybridIndex([documents[0], documents[2], documents[3], documents[5]], fusion="linear")
+    assert len(index) == len(fresh)
+    assert ranked(index) == ranked(fresh)
+    assert ranked(index, papers=[index.positions["paper-3"]]) == ranked(fresh, papers=[fresh.positions["paper-3"]])
+    assert ranked(index, papers=[1]) == []
+    assert not index.remove("paper-1")
+
+
+def test_compaction_keeps_remaining_papers_searchable():
+    documents = [make_document(number, chunks=300) for number in range(10)]
+    index = HybridIndex(documents)
+    for document in documents[:8]:
+        index.remove(document.url)
+    # The arrays were compacted when the sixth removal left more dead chunks than live ones
+    assert len(index) == 600
+    assert len(index.chunks) == 1200
+
+    fresh = HybridIndex(documents[8:])
+    assert ranked(index) == ranked(fresh)
+    assert {url for url, _, _ in ranked(index, k=50)} <= {"paper-8", "paper-9"}
+    assert ranked(index, papers=[index.positions["paper-9"]]) == ranked(fresh, papers=[1])
@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+from app.agents.generation import QueueFullError
+from app.agents.ingest_queue import IngestQueue, PRIORITY_INTERACTIVE, PRIORITY_PREFETCH
+
+
+class StubCache:
+    def __init__(self):
+        self.metas = {}
+
+    def get_meta(self, url):
+        return self.metas.get(url)
+
+
+class StubPipeline:
+    """
+    Records loaded papers in a stub document cache; loads block while `gate` is clear.
+    """
+
+    def __init__(self):
+        self.cache = StubCache()
+        self.stale = set()
+        self.loads = []
+        self.summaries = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def load_paper(self, url, on_progress=None):
+        self.gate.wait(timeout=10)
+        self.loads.append(url)
+        self.cache.metas[url] = {"url": url}
+        return url
+
+    def is_fresh(self, meta):
+        return meta["url"] not in self.stale
+
+    def summarize_document(self, document):
+        self.summaries.append(document)
+
+
+def wait_until_idle(queue, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = queue.stats()
+        if not stats["queued"] and not stats["running"]:
+            return
+        time.sleep(0.01)
+    raise AssertionError("ingest queue did not drain")
+
+
+@pytest.fixture
+def pipeline():
+    return StubPipeline()
+
+
+@pytest.fixture
+def ingest(pipeline):
+    queue = IngestQueue(pipeline, workers=1, max_queue=2, summarize=False)
+    yield queue
+    pipeline.gate.set()
+    queue.shutdown()
+
+
+def test_enqueue_deduplicates_queued_and_done_papers(ingest, pipeline):
+    first = ingest.enqueue(["a.pdf"])[0]
+    wait_until_idle(ingest)
+    again = ingest.enqueue(["a.pdf"])[0]
+
+    assert again is first
+    assert pipeline.loads == ["a.pdf"]
+
+
+def test_done_paper_is_queued_again_once_evicted_or_stale(ingest, pipeline):
+    first = ingest.enqueue(["a.pdf"])[0]
+    wait_until_idle(ingest)
+
+    del pipeline.cache.metas["a.pdf"]
+    evicted = ingest.enqueue(["a.pdf"])[0]
+    wait_until_idle(ingest)
+    assert evicted is not first
+
+    pipeline.stale.add("a.pdf")
+    stale = ingest.enqueue(["a.pdf"])[0]
+    wait_until_idle(ingest)
+    assert stale not in (first, evicted)
+    assert pipeline.loads == ["a.pdf"] * 3
+
+
+def test_interactive_request_raises_prefetched_priority(ingest, pipeline):
+    pipeline.gate.clear()
+    ingest.enqueue(["busy.pdf"])
+    prefetched = ingest.enqueue(["b.pdf"], priority=PRIORITY_PREFETCH)[0]
+    bumped = ingest.enqueue(["b.pdf"], priority=PRIORITY_INTERACTIVE)[0]
+
+    assert bumped is prefetched
+    assert bumped.priority == PRIORITY_INTERACTIVE
+
+
+def test_full_queue_rejects_or_skips(ingest, pipeline):
+    pipeline.gate.clear()
+    ingest.enqueue(["busy.pdf"])
+    # Wait for the worker to pick it up, so the queued slots are free
+    deadline = time.monotonic() + 10
+    while ingest.stats()["running"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    ingest.enqueue(["b.pdf", "c.pdf"])
+
+    assert ingest.enqueue(["d.pdf"], best_effort=True) == []
+    with pytest.raises(QueueFullError):
+        ingest.enqueue(["d.pdf"])